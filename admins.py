@@ -0,0 +1,76 @@
+import asyncio
+from aiogram.dispatcher.filters import BoundFilter
+import database
+
+# === O'ZGARMAS SNAPSHOT ===
+# Ruxsat tekshiruvi bazaga bormaydi: faqat shu to'plam o'qiladi.
+# Bazadan yuklanguncha standart adminlar amal qiladi.
+_snapshot = frozenset(database.DEFAULT_ADMINS)
+_reload_lock = asyncio.Lock()
+
+
+def current():
+    return _snapshot
+
+
+def is_admin(user_id):
+    return user_id in _snapshot
+
+
+async def reload():
+    global _snapshot
+    async with _reload_lock:
+        _snapshot = frozenset(await database.get_all_admins())
+    return _snapshot
+
+
+async def add(user_id):
+    """Yangi admin bo'lsa True. Boshqa jarayonlarga trigger NOTIFY yuboradi."""
+    global _snapshot
+    added = await database.add_admin(user_id)
+    _snapshot = _snapshot | {user_id}
+    return added
+
+
+async def remove(user_id):
+    global _snapshot
+    removed = await database.remove_admin(user_id)
+    _snapshot = _snapshot - {user_id}
+    return removed
+
+
+# === Jarayonlar orasida yangilash (admins_notify trigger) ===
+def _on_notify(payload):
+    global _snapshot
+    op, user_id = payload.split(":")
+    user_id = int(user_id)
+    _snapshot = _snapshot | {user_id} if op == "add" else _snapshot - {user_id}
+
+
+async def _safe_reload():
+    try:
+        await reload()
+    except Exception as e:
+        print(f"❗ Adminlar ro‘yxatini yangilashda xatolik: {e}")
+
+
+def _on_reset():
+    # LISTEN ulanishi uzilgan/qayta ulangan: o'tkazib yuborilgan o'zgarishlar uchun to'liq yuklash
+    if database.db_pool is not None:
+        asyncio.ensure_future(_safe_reload())
+
+
+database.listen(database.ADMINS_CHANNEL, _on_notify, on_reset=_on_reset)
+
+
+# === Filtr: @dp.message_handler(is_admin=True) ===
+class AdminFilter(BoundFilter):
+    """user_id=ADMINS o'rnida: ro'yxat ro'yxatdan o'tishda nusxalanmaydi, har safar snapshot o'qiladi."""
+    key = "is_admin"
+
+    def __init__(self, is_admin):
+        self.is_admin = is_admin
+
+    async def check(self, obj):
+        user = getattr(obj, "from_user", None)
+        return user is not None and (user.id in _snapshot) == self.is_admin
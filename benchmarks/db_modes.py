@@ -0,0 +1,128 @@
+"""DB_MODE=direct va DB_MODE=pgbouncer rejimlarida issiq so'rovlar kechikishi.
+
+get_kino_by_code (kesh yuklanmagan holat), add_user va increment_stat
+bazaga yozadigan so'rovlar (flush_new_users / flush_stats) har bir rejimning
+pool sozlamalari bilan o'lchanadi. Faqat sinov bazasida ishga tushiring:
+kino_codes ga bench_* kodlari yoziladi va oxirida o'chiriladi.
+
+    BENCH_DATABASE_URL=postgresql://postgres@127.0.0.1:5432/postgres \\
+    BENCH_PGBOUNCER_URL=postgresql://postgres@127.0.0.1:6432/postgres \\
+    python benchmarks/db_modes.py --iterations 5000 --concurrency 8
+
+BENCH_PGBOUNCER_URL berilmasa pgbouncer rejimi ham to'g'ridan-to'g'ri bazaga
+ulanadi - bunda faqat tayyorlangan so'rovlar keshining ta'siri ko'rinadi.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+os.environ["DATABASE_URL"] = DSN or ""
+os.environ.setdefault("DB_SSL", "disable")
+
+import asyncpg  # noqa: E402
+import database  # noqa: E402
+
+SEED_CODES = 1000
+BENCH_USER_BASE = 9_000_000_000_000
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))] * 1e3
+
+
+async def measure(name, operation, iterations, concurrency):
+    latencies = []
+    counter = iter(range(iterations))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"  {name:<18} {iterations / elapsed:>8.0f} op/s   "
+        f"p50 {percentile(latencies, 0.5):>6.2f} ms   p99 {percentile(latencies, 0.99):>6.2f} ms"
+    )
+
+
+async def bench_mode(mode, dsn, args, run_id):
+    options = database.pool_options(mode)
+    t0 = time.perf_counter()
+    pool = await asyncpg.create_pool(dsn=dsn, **options)
+    if mode == "direct":
+        await database.warm_pool(pool)
+    print(
+        f"{mode}: min_size={options['min_size']} max_size={options['max_size']} "
+        f"statement_cache_size={options['statement_cache_size']} "
+        f"(pool tayyor: {(time.perf_counter() - t0) * 1e3:.0f} ms)"
+    )
+    database.db_pool = pool
+    rnd = random.Random(args.seed)
+    user_base = BENCH_USER_BASE + run_id * 10_000_000
+
+    async def get_kino(i):
+        await database.get_kino_by_code(f"bench_{rnd.randrange(SEED_CODES)}")
+
+    async def add_user(i):
+        async with database.acquire() as conn:
+            await conn.execute(database.SQL_INSERT_USERS, [user_base + i])
+
+    async def increment_stat(i):
+        async with database.acquire() as conn:
+            await conn.execute(database.SQL_UPSERT_STATS, [f"bench_{rnd.randrange(SEED_CODES)}"], [1], [0])
+
+    try:
+        await measure("get_kino_by_code", get_kino, args.iterations, args.concurrency)
+        await measure("add_user", add_user, args.iterations, args.concurrency)
+        await measure("increment_stat", increment_stat, args.iterations, args.concurrency)
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM users WHERE user_id BETWEEN $1 AND $2", user_base, user_base + args.iterations
+            )
+        await pool.close()
+        database.db_pool = None
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not DSN:
+        sys.exit("BENCH_DATABASE_URL ko'rsatilmagan")
+
+    await database.init_db()
+    async with database.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO kino_codes (code, channel, message_id, post_count, title) "
+            "VALUES ($1, '@bench', 1, 12, $2) ON CONFLICT DO NOTHING",
+            [(f"bench_{i}", f"Bench anime {i}") for i in range(SEED_CODES)],
+        )
+    setup_pool = database.db_pool
+
+    try:
+        modes = [("direct", DSN), ("pgbouncer", os.getenv("BENCH_PGBOUNCER_URL") or DSN)]
+        for run_id, (mode, dsn) in enumerate(modes):
+            await bench_mode(mode, dsn, args, run_id)
+    finally:
+        async with setup_pool.acquire() as conn:
+            await conn.execute("DELETE FROM stats WHERE code LIKE 'bench\\_%'")
+            await conn.execute("DELETE FROM kino_codes WHERE code LIKE 'bench\\_%'")
+        await setup_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
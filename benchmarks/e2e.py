@@ -0,0 +1,299 @@
+"""Uchdan-uchgacha o'tkazuvchanlik: soxta Bot API + haqiqiy Postgres + haqiqiy dp.
+
+Alohida jarayondagi aiohttp server Telegram Bot API o'rnida turadi (BOT_API_SERVER
+shunga qaratiladi), bot esa main.py dagi handlerlar, pipeline, FSM storage va keshlar
+bilan to'liq ishga tushadi (on_startup). So'ng sintetik update oqimlari
+dp.updates_handler.notify ga - polling va webhook bilan bir xil yo'lga - beriladi:
+
+    code      raqamli kod, N ta homiy kanal obunasi tekshiriladi
+    start     /start <kod> deep link
+    kino      "kino" qism tugmasi (callback)
+    konkurs   /start konkurs - ishtirokchi qo'shish
+
+Har bir ssenariy uchun: update/s, p50/p99 kechikish, bitta update ga to'g'ri
+keladigan DB so'rovlari va Bot API chaqiruvlari (fon flush'lari ham kiradi).
+
+    BENCH_DATABASE_URL=postgresql://postgres@127.0.0.1:5432/bench \\
+    python benchmarks/e2e.py --updates 2000 --users 200 --channels 3
+
+BENCH_DATABASE_URL berilmasa, PATH dagi (yoki PG_BIN dagi) initdb/pg_ctl bilan
+vaqtinchalik Postgres ko'tariladi va oxirida o'chiriladi (root bo'lmagan
+foydalanuvchidan ishga tushiring).
+"""
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_TOKEN = "123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+BENCH_CODE = "990001"
+BENCH_POST_COUNT = 24
+BENCH_USER_BASE = 7_000_000_000_000
+BENCH_CHANNEL_BASE = -1009900000000
+SCENARIOS = ("code", "start", "kino", "konkurs")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# === Vaqtinchalik Postgres ===
+@contextlib.contextmanager
+def throwaway_postgres():
+    bin_dir = os.getenv("PG_BIN")
+    initdb = os.path.join(bin_dir, "initdb") if bin_dir else shutil.which("initdb")
+    pg_ctl = os.path.join(bin_dir, "pg_ctl") if bin_dir else shutil.which("pg_ctl")
+    if not initdb or not pg_ctl:
+        sys.exit("BENCH_DATABASE_URL ko'rsatilmagan va initdb/pg_ctl topilmadi (PG_BIN)")
+    data_dir = tempfile.mkdtemp(prefix="bench-pg-")
+    port = free_port()
+    try:
+        subprocess.run([initdb, "-D", data_dir, "-U", "postgres", "--auth=trust"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([pg_ctl, "-D", data_dir, "-w", "-l", os.path.join(data_dir, "log"),
+                        "-o", f"-p {port} -k {data_dir} -c listen_addresses=127.0.0.1", "start"],
+                       check=True, stdout=subprocess.DEVNULL)
+        yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+# === Soxta Bot API (alohida jarayonda: bot bilan bir event loop'ni bo'lishmaydi) ===
+class FakeBotAPI:
+    """Bot API metodlariga minimal, lekin aiogram qabul qiladigan javoblar.
+
+    GET /stats chaqiruvlar sonini qaytaradi va hisoblagichni nolga tushiradi.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    def _message(self, chat_id, text=None):
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": text or ""}
+
+    def _result(self, method, data):
+        chat_id = int(data.get("chat_id") or 0)
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "getChatMember":
+            user = {"id": int(data["user_id"]), "is_bot": False, "first_name": "u"}
+            return {"status": "member", "user": user}
+        if method == "getChat":
+            return {"id": chat_id, "type": "channel", "title": f"Kanal {chat_id}"}
+        if method in ("sendMessage", "sendPhoto", "editMessageText"):
+            return self._message(chat_id, data.get("text"))
+        if method == "copyMessage":
+            self._message_id += 1
+            return {"message_id": self._message_id}
+        if method == "copyMessages":
+            return [{"message_id": self._message_id + i} for i in range(len(data["message_ids"].split(",")))]
+        return True
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    async def stats(self, request):
+        calls = dict(self.calls)
+        self.calls.clear()
+        return web.json_response(calls)
+
+    def serve(self, port):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.stats)
+        web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+def start_fake_api(latency):
+    port = free_port()
+    process = multiprocessing.Process(target=FakeBotAPI(latency).serve, args=(port,), daemon=True)
+    process.start()
+    for _ in range(100):
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return process, f"http://127.0.0.1:{port}"
+        time.sleep(0.05)
+    process.terminate()
+    sys.exit("Soxta Bot API ishga tushmadi")
+
+
+# === DB so'rovlarini sanash ===
+class QueryCounter:
+    """database.acquire() orqali olingan ulanishlardagi barcha so'rovlar."""
+
+    def __init__(self, database):
+        self.count = 0
+        self._acquire = database.acquire
+        database.acquire = self.acquire
+
+    def _log(self, record):
+        self.count += 1
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        async with self._acquire() as conn:
+            conn.add_query_logger(self._log)
+            try:
+                yield conn
+            finally:
+                conn.remove_query_logger(self._log)
+
+
+# === Sintetik update'lar ===
+def make_update(types, update_id, user_id, text=None, callback_data=None):
+    user = {"id": user_id, "is_bot": False, "first_name": "Bench"}
+    chat = {"id": user_id, "type": "private"}
+    if callback_data is None:
+        message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": text}
+        return types.Update(update_id=update_id, message=message)
+    message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "text": "x"}
+    callback = {"id": str(update_id), "from": user, "chat_instance": "1", "message": message, "data": callback_data}
+    return types.Update(update_id=update_id, callback_query=callback)
+
+
+def scenario_updates(name, types, router, count, users, user_base):
+    payloads = {
+        "code": {"text": BENCH_CODE},
+        "start": {"text": f"/start {BENCH_CODE}"},
+        "kino": {"callback_data": router.pack("kino", BENCH_CODE, 3)},
+        "konkurs": {"text": "/start konkurs"},
+    }[name]
+    return [make_update(types, i + 1, user_base + i % users, **payloads) for i in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_scenario(name, dp, updates, concurrency, api_stats, queries, flush):
+    latencies = []
+    pending = iter(updates)
+
+    async def producer():
+        for update in pending:
+            started = time.perf_counter()
+            await dp.updates_handler.notify(update)
+            latencies.append(time.perf_counter() - started)
+
+    await api_stats()
+    queries.count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await flush()  # bufer'dagi statistika/foydalanuvchilar ham shu ssenariy hisobiga
+    await asyncio.sleep(0.05)  # fon yuborishlar (copyMessages) va query logger callback'lari
+    total = len(updates)
+    calls = Counter(await api_stats())
+    api_calls = sum(calls.values())
+    print(f"{name:<8} {total / elapsed:>9.0f} upd/s   p50 {percentile(latencies, 0.5) * 1000:>6.2f} ms"
+          f"   p99 {percentile(latencies, 0.99) * 1000:>7.2f} ms"
+          f"   DB {queries.count / total:>5.2f}/upd   API {api_calls / total:>5.2f}/upd"
+          f"   ({', '.join(f'{m} {c}' for m, c in calls.most_common())})")
+
+
+async def bench(args, dsn, api_url):
+    os.environ.update(API_TOKEN=BENCH_TOKEN, BOT_API_SERVER=api_url, DATABASE_URL=dsn, BOT_MODE="polling")
+    os.environ.setdefault("DB_SSL", "disable")
+
+    from aiogram import Bot, Dispatcher, types
+    import database
+    import main
+
+    queries = QueryCounter(database)
+    Bot.set_current(main.bot)
+    Dispatcher.set_current(main.dp)
+    await main.on_startup(main.dp)
+
+    sponsor_ids = [BENCH_CHANNEL_BASE - i for i in range(args.channels)]
+    for channel_id in sponsor_ids:
+        await main.channels.add("sub", channel_id, f"https://t.me/+bench{channel_id}")
+        await main.channels.add("main", channel_id, f"https://t.me/+bench{channel_id}")
+    await database.add_kino_code(BENCH_CODE, "@bench_server", 100, BENCH_POST_COUNT, "Bench anime")
+
+    async def flush():
+        await database.flush_new_users()
+        await database.flush_stats()
+
+    stats_session = aiohttp.ClientSession()
+
+    async def api_stats():
+        async with stats_session.get(f"{api_url}/stats") as response:
+            return await response.json()
+
+    print(f"{args.updates} update, {args.users} foydalanuvchi, {args.concurrency} parallel,"
+          f" {args.channels} homiy kanal, API kechikishi {args.api_latency} ms")
+    try:
+        for offset, name in enumerate(args.scenarios):
+            user_base = BENCH_USER_BASE + offset * 1_000_000  # har ssenariyda kesh sovuq boshlanadi
+            updates = scenario_updates(name, types, main.router, args.updates, args.users, user_base)
+            await run_scenario(name, main.dp, updates, args.concurrency, api_stats, queries, flush)
+    finally:
+        await main.on_shutdown(main.dp)
+        for channel_id in sponsor_ids:
+            await main.channels.remove("sub", channel_id)
+            await main.channels.remove("main", channel_id)
+        await database.delete_kino_code(BENCH_CODE)
+        async with database.acquire() as conn:
+            for table in ("users", "konkurs_participants", "fsm_states"):
+                column = "chat_id" if table == "fsm_states" else "user_id"
+                await conn.execute(f"DELETE FROM {table} WHERE {column} >= $1", BENCH_USER_BASE)
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+        await database.db_pool.close()
+        await (await main.bot.get_session()).close()
+        await stats_session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000, help="har bir ssenariy uchun")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--channels", type=int, default=3, help="homiy kanallar soni")
+    parser.add_argument("--api-latency", type=float, default=0, help="soxta Bot API javob kechikishi, ms")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    dsn = os.getenv("BENCH_DATABASE_URL")
+    api_process, api_url = start_fake_api(args.api_latency / 1000)
+    # konkurs participants/ papkasi va boshqa fayllar repo ichida qolmasin
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as workdir:
+        os.chdir(workdir)
+        try:
+            with (contextlib.nullcontext(dsn) if dsn else throwaway_postgres()) as dsn:
+                asyncio.run(bench(args, dsn, api_url))
+        finally:
+            api_process.terminate()
+
+
+if __name__ == "__main__":
+    main()
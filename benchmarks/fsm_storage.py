@@ -0,0 +1,85 @@
+"""MemoryStorage va PostgresStorage o'tkazuvchanligi.
+
+Har bir "foydalanuvchi" botdagi odatiy admin oqimini takrorlaydi: har xabarda
+get_state (dispatcher holat filtri), so'ng set_state / update_data /
+get_data / finish. Alohida oddiy foydalanuvchilar oqimi ham o'lchanadi: ularda
+holat yo'q va faqat get_state chaqiriladi - bu eng ko'p uchraydigan holat.
+
+    BENCH_DATABASE_URL=postgresql://postgres@127.0.0.1:5432/postgres \\
+    python benchmarks/fsm_storage.py --users 200 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+os.environ["DATABASE_URL"] = DSN or ""
+os.environ.setdefault("DB_SSL", "disable")
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+from aiogram.dispatcher.storage import FSMContext  # noqa: E402
+import database  # noqa: E402
+from fsm_storage import PostgresStorage  # noqa: E402
+
+BENCH_CHAT_BASE = 8_000_000_000_000
+
+
+async def admin_flow(storage, user_id):
+    """Bir "📤 Post qilish" oqimi: 4 ta xabar, 11 ta storage chaqiruvi."""
+    ctx = FSMContext(storage, user_id, user_id)
+    await ctx.get_state()
+    await ctx.set_state("PostStates:waiting_for_image")
+    await ctx.get_state()
+    await ctx.update_data(media=["photo", "AgACAgIAAxkBAAI"])
+    await ctx.set_state("PostStates:waiting_for_title")
+    await ctx.get_state()
+    await ctx.update_data(title="Naruto 1-qism")
+    await ctx.set_state("PostStates:waiting_for_link")
+    await ctx.get_state()
+    await ctx.get_data()
+    await ctx.finish()
+    return 11
+
+
+async def idle_user(storage, user_id):
+    ctx = FSMContext(storage, user_id, user_id)
+    await ctx.get_state()
+    return 1
+
+
+async def run(name, storage, flow, users, rounds):
+    operations = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        counts = await asyncio.gather(*(flow(storage, BENCH_CHAT_BASE + i) for i in range(users)))
+        operations += sum(counts)
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<28} {operations / elapsed:>10.0f} op/s   ({operations} chaqiruv, {elapsed:.2f} s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    if not DSN:
+        sys.exit("BENCH_DATABASE_URL ko'rsatilmagan")
+
+    await database.init_db()
+    for flow_name, flow in (("admin oqimi", admin_flow), ("holatsiz foydalanuvchi", idle_user)):
+        print(flow_name)
+        await run("MemoryStorage", MemoryStorage(), flow, args.users, args.rounds)
+        await run("PostgresStorage", PostgresStorage(), flow, args.users, args.rounds)
+        await run("PostgresStorage (keshsiz)", PostgresStorage(cache_size=0), flow, args.users, args.rounds)
+
+    async with database.acquire() as conn:
+        await conn.execute("DELETE FROM fsm_states WHERE chat_id >= $1", BENCH_CHAT_BASE)
+    await database.db_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""Inline so'rovlar o'tkazuvchanligi: kesh bilan va keshsiz.
+
+Bazasiz ishlaydi - search.index sintetik nomlar bilan to'ldiriladi.
+Foydalanuvchilar nomni harfma-harf yozadi ("n", "na", "nar", ...), har bir
+harf alohida inline so'rov bo'ladi. Javob Telegramga yuboriladigan JSON
+holatigacha (serializatsiya bilan) tayyorlanadi.
+
+    python benchmarks/inline_bench.py --titles 20000 --queries 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search  # noqa: E402
+from inline import InlineCache, INLINE_PAGE_SIZE  # noqa: E402
+
+WORDS = [
+    "naruto", "shippuden", "one", "piece", "attack", "titan", "jujutsu", "kaisen",
+    "bleach", "demon", "slayer", "hunter", "death", "note", "tokyo", "ghoul",
+    "dragon", "ball", "sword", "art", "online", "black", "clover", "blue", "lock",
+]
+
+
+def make_titles(count, rnd):
+    titles = []
+    for _ in range(count):
+        words = rnd.sample(WORDS, rnd.randint(1, 3))
+        words.append("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 8))))
+        titles.append(" ".join(words).title())
+    return titles
+
+
+def make_queries(titles, count, rnd):
+    """Yozilish oqimi: har bir nomning prefikslari, ba'zan keyingi sahifa."""
+    queries = []
+    while len(queries) < count:
+        title = rnd.choice(titles).lower()
+        for end in range(0, min(len(title), 12) + 1):
+            offset = str(INLINE_PAGE_SIZE) if rnd.random() < 0.05 else ""
+            queries.append((title[:end], offset))
+    return queries[:count]
+
+
+def uncached_page(query, offset, bot_username):
+    """Har so'rovda hisoblash: qidiruv + natijalar va JSON qaytadan quriladi."""
+    return InlineCache().page(query, offset, bot_username)
+
+
+def run(name, handler, queries):
+    latencies = []
+    started = time.perf_counter()
+    for query, offset in queries:
+        t0 = time.perf_counter()
+        handler(query, offset, "animebot")
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"{name:<12} {len(queries) / elapsed:>10.0f} so'rov/s   p50 {p50:>8.1f} µs   p99 {p99:>8.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    titles = make_titles(args.titles, rnd)
+    for i, title in enumerate(titles, 1):
+        search.index.upsert(str(i), title)
+    search.index.set_popularity({str(i): rnd.randint(0, 1000) for i in range(1, args.titles + 1)})
+    queries = make_queries(titles, args.queries, rnd)
+
+    cache = InlineCache()
+    t0 = time.perf_counter()
+    prefixes = asyncio.run(cache.rebuild())
+    print(f"{args.titles} ta nom, {prefixes} ta prefiks oldindan hisoblandi: {time.perf_counter() - t0:.2f} s")
+
+    run("keshsiz", uncached_page, queries[: max(1, len(queries) // 10)])
+    run("kesh", cache.page, queries)
+    run("kesh/issiq", cache.page, queries)
+
+
+if __name__ == "__main__":
+    main()
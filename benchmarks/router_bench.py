@@ -0,0 +1,136 @@
+"""Dispatch narxi: lambda filtrlar zanjiri va router jadvali.
+
+Ikkala dispatcherda botdagi kabi tugma matnlari, callback prefikslari va oxirida
+raqamli kod handleri bor; handlerlar bo'sh, ya'ni faqat dispatch o'lchanadi.
+Update'lar aralash: kod (raqam), reply-tugma va qismlar tugmalari.
+
+    python benchmarks/router_bench.py --updates 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+from router import Router  # noqa: E402
+
+ADMIN_ID = 1000
+USER_ID = 2000
+ADMINS = {ADMIN_ID}
+
+# (matn, faqat admin uchun) - main.py dagi tartibda
+TEXTS = [
+    ("🎞 Barcha animelar", False), ("🔎 Nomi bo‘yicha qidirish", False),
+    ("✉️ Admin bilan bog‘lanish", False), ("📡 Kanal boshqaruvi", True),
+    ("➕ Admin qo‘shish", True), ("📈 Kod statistikasi", True), ("✏️ Kodni tahrirlash", True),
+    ("❌ Kodni o‘chirish", True), ("📤 Post qilish", True), ("➕ Anime qo‘shish", True),
+    ("📄 Kodlar ro‘yxati", False), ("📊 Statistika", True), ("⬅️ Orqaga", True),
+    ("📘 Qo‘llanma", False), ("📢 Habar yuborish", True), ("🏆 Konkurs", False),
+]
+# (nom, qisqa nom, argument turlari, faqat admin uchun)
+CALLBACKS = [
+    ("checksub", "c", (str,), False), ("catalog", "g", (str, str), False), ("search", "s", (str,), False),
+    ("channel_type", "t", (str,), True), ("action", "a", (str,), True), ("del", "d", (str, int), True),
+    ("help", "h", (str,), False), ("back_help", "b", (), False), ("kino", "k", (str, int), False),
+    ("kinopage", "p", (str, int), False), ("kinorange", "r", (str, int, int), False),
+    ("konkurs", "z", (str,), False),
+]
+LEGACY_PREFIXES = {"del": "del_", "help": "help_"}
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def lambda_dispatcher(bot):
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    for text, admin in TEXTS:
+        extra = {"user_id": ADMINS} if admin else {}
+        dp.register_message_handler(noop, lambda m, t=text: m.text == t, **extra)
+    for name, _, _, admin in CALLBACKS:
+        prefix = LEGACY_PREFIXES.get(name, f"{name}:")
+        extra = {"user_id": ADMINS} if admin else {}
+        dp.register_callback_query_handler(noop, lambda c, p=prefix: c.data.startswith(p), **extra)
+    dp.register_message_handler(noop, lambda m: m.text.isdigit())
+    return dp
+
+
+def router_dispatcher(bot):
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    router = Router()
+    for text, admin in TEXTS:
+        router.text(text, admin_only=admin)(noop)
+    for name, short, kinds, admin in CALLBACKS:
+        router.callback(name, short, *kinds, admin_only=admin)(noop)
+    router.register(dp, is_admin=lambda user_id: user_id in ADMINS)
+    dp.register_message_handler(noop, lambda m: m.text.isdigit())
+    return dp, router
+
+
+def make_updates(count, callback_data):
+    user = {"id": USER_ID, "is_bot": False, "first_name": "u"}
+    chat = {"id": USER_ID, "type": "private"}
+    kinds = [
+        ("message", "91"),  # eng ko'p uchraydigan holat: barcha matn filtrlaridan o'tadi
+        ("message", "📘 Qo‘llanma"),
+        ("callback", callback_data["kino"]),
+        ("callback", callback_data["kinorange"]),
+    ]
+    updates = []
+    for i in range(count):
+        kind, value = kinds[i % len(kinds)]
+        if kind == "message":
+            payload = {"message": {"message_id": i, "date": 0, "chat": chat, "from": user, "text": value}}
+        else:
+            message = {"message_id": i, "date": 0, "chat": chat, "text": "x"}
+            payload = {"callback_query": {"id": str(i), "from": user, "chat_instance": "1",
+                                          "message": message, "data": value}}
+        updates.append(types.Update(update_id=i, **payload))
+    return updates
+
+
+async def measure(name, dp, updates):
+    Dispatcher.set_current(dp)
+    for update in updates[:500]:  # isitish
+        await dp.process_update(update)
+    started = time.perf_counter()
+    for update in updates:
+        await dp.process_update(update)
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<24} {elapsed / len(updates) * 1e6:>8.1f} µs/update")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot("123456:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA")
+    Bot.set_current(bot)
+    old_dp = lambda_dispatcher(bot)
+    new_dp, router = router_dispatcher(bot)
+    legacy = {"kino": "kino:91:3", "kinorange": "kinorange:91:1:10"}
+    compact = {"kino": router.pack("kino", "91", 3), "kinorange": router.pack("kinorange", "91", 1, 10)}
+
+    print("dispatch (filtrlar + bo'sh handler)")
+    before = await measure("lambda zanjiri", old_dp, make_updates(args.updates, legacy))
+    after = await measure("router (eski format)", new_dp, make_updates(args.updates, legacy))
+    compact_time = await measure("router (v1 format)", new_dp, make_updates(args.updates, compact))
+    print(f"  tejash: {(before - after) / args.updates * 1e6:.1f} µs/update ({before / after:.1f}x),"
+          f" v1: {before / compact_time:.1f}x")
+
+    print("callback_data tahlili")
+    for data in (legacy["kinorange"], compact["kinorange"]):
+        started = time.perf_counter()
+        for _ in range(100000):
+            router.parse(data)
+        print(f"  {data:<24} {(time.perf_counter() - started) * 10:>8.2f} µs")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+from aiogram.utils.exceptions import RetryAfter, MessageNotModified
+import database
+
+# === SOZLAMALAR ===
+# Telegram umumiy chegarasi ~30 xabar/soniya, biroz zaxira qoldiramiz
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+# Har shuncha foydalanuvchidan keyin kursor bazaga yoziladi
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "200"))
+BROADCAST_STATUS_INTERVAL = float(os.getenv("BROADCAST_STATUS_INTERVAL", "5"))
+BROADCAST_MAX_RETRIES = 3
+# Shuncha vaqt heartbeat bo'lmasa, vazifa to'xtab qolgan hisoblanadi
+BROADCAST_STALE_AFTER = timedelta(minutes=5)
+# Ishlayotgan vazifa heartbeat'i (uzoq RetryAfter kutishlarida ham) shu oraliqda yangilanadi
+BROADCAST_HEARTBEAT_INTERVAL = 30
+# To'xtab qolgan vazifalar shu oraliqda qidiriladi (qayta ishga tushgan jarayonnikilar ham)
+BROADCAST_RESUME_INTERVAL = float(os.getenv("BROADCAST_RESUME_INTERVAL", "60"))
+
+
+# === TEZLIK CHEKLOVCHI ===
+class RateLimiter:
+    """Token bucket: soniyasiga `rate` tagacha ruxsat. Flood-wait kelsa hamma kutadi."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate // 5))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+limiter = RateLimiter(BROADCAST_RATE)
+_running = {}  # job_id -> task
+
+
+# === YUBORISH ===
+async def _deliver(bot, user_id, from_chat, message_id):
+    for _ in range(BROADCAST_MAX_RETRIES):
+        await limiter.acquire()
+        try:
+            await bot.forward_message(user_id, from_chat, message_id)
+            return True
+        except RetryAfter as e:
+            limiter.pause(e.timeout)
+        except Exception as e:
+            print(f"Xatolik {user_id} uchun: {e}")
+            return False
+    return False
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} soat {seconds % 3600 // 60} daqiqa"
+    if seconds >= 60:
+        return f"{seconds // 60} daqiqa {seconds % 60} soniya"
+    return f"{seconds} soniya"
+
+
+def render_status(total, sent, failed, speed=None, finished=False):
+    done = sent + failed
+    percent = done * 100 // total if total else 100
+    header = "✅ Habar yuborish yakunlandi!" if finished else "📢 Habar yuborilmoqda..."
+    text = (
+        f"{header}\n\n"
+        f"✅ Yuborildi: {sent} ta\n"
+        f"❌ Xatolik: {failed} ta\n"
+        f"📊 {done}/{total} ({percent}%)"
+    )
+    if not finished and speed:
+        text += f"\n⚡️ {speed:.1f} ta/soniya\n⏱ Qolgan vaqt: ~{_format_eta(max(total - done, 0) / speed)}"
+    return text
+
+
+async def _edit_status(bot, job, text):
+    if not job["status_message_id"]:
+        return
+    try:
+        await bot.edit_message_text(text, job["admin_chat_id"], job["status_message_id"])
+    except MessageNotModified:
+        pass
+    except Exception as e:
+        print(f"❗ Holat xabarini yangilab bo‘lmadi: {e}")
+
+
+async def run_job(bot, job):
+    job_id = job["id"]
+    total = job["total"]
+    sent, failed = job["sent"], job["failed"]
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    started_at = time.monotonic()
+    started_done = sent + failed
+    last_status_at = started_at
+
+    async def send(user_id):
+        async with semaphore:
+            return await _deliver(bot, user_id, job["from_chat"], job["message_id"])
+
+    async def process(chunk):
+        nonlocal sent, failed, last_status_at
+        results = await asyncio.gather(*(send(user_id) for user_id in chunk))
+        ok = sum(results)
+        sent += ok
+        failed += len(results) - ok
+        await database.save_broadcast_checkpoint(job_id, chunk[-1], sent, failed)
+        now = time.monotonic()
+        if now - last_status_at >= BROADCAST_STATUS_INTERVAL:
+            last_status_at = now
+            speed = (sent + failed - started_done) / (now - started_at)
+            await _edit_status(bot, job, render_status(max(total, sent + failed), sent, failed, speed))
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        chunk = []
+        async for user_id in database.iter_user_ids(job["last_user_id"]):
+            chunk.append(user_id)
+            if len(chunk) >= BROADCAST_CHUNK_SIZE:
+                await process(chunk)
+                chunk = []
+        if chunk:
+            await process(chunk)
+    except Exception as e:
+        print(f"❗ Habar yuborish #{job_id} to‘xtadi: {e}")
+        await database.finish_broadcast_job(job_id, "failed")
+        await _edit_status(bot, job, render_status(total, sent, failed) + f"\n\n❗ To‘xtadi: {e}")
+        return
+    finally:
+        heartbeat.cancel()
+
+    await database.finish_broadcast_job(job_id, "done")
+    await _edit_status(bot, job, render_status(sent + failed, sent, failed, finished=True))
+
+
+async def _heartbeat(job_id):
+    """Chunk'lar orasidagi uzoq tanaffuslarda ham vazifa boshqa jarayonga eskirgan ko'rinmasin."""
+    while True:
+        await asyncio.sleep(BROADCAST_HEARTBEAT_INTERVAL)
+        try:
+            await database.touch_broadcast_job(job_id)
+        except Exception as e:
+            print(f"❗ Habar yuborish #{job_id} heartbeat xatosi: {e}")
+
+
+def _spawn(bot, job):
+    task = asyncio.create_task(run_job(bot, job))
+    _running[job["id"]] = task
+    task.add_done_callback(lambda t: _running.pop(job["id"], None))
+    return task
+
+
+async def start_broadcast(bot, admin_chat_id, from_chat, message_id):
+    """Yangi vazifani bazaga yozadi va fon rejimida ishga tushiradi."""
+    job = dict(await database.create_broadcast_job(from_chat, message_id, admin_chat_id))
+    status = await bot.send_message(admin_chat_id, render_status(job["total"], 0, 0))
+    job["status_message_id"] = status.message_id
+    await database.set_broadcast_status_message(job["id"], status.message_id)
+    _spawn(bot, job)
+    return job
+
+
+async def resume_broadcasts(bot):
+    """Jarayon qayta ishga tushganda tugallanmagan vazifalarni davom ettiradi."""
+    jobs = [job for job in await database.claim_stale_broadcast_jobs(BROADCAST_STALE_AFTER)
+            if job["id"] not in _running]
+    for job in jobs:
+        _spawn(bot, dict(job))
+    return len(jobs)
+
+
+async def resume_loop(bot):
+    """Qayta ishga tushish 5 daqiqadan tez bo'lsa ham, to'xtagan vazifa keyinroq shu yerda olinadi."""
+    while True:
+        await asyncio.sleep(BROADCAST_RESUME_INTERVAL)
+        try:
+            resumed = await resume_broadcasts(bot)
+            if resumed:
+                print(f"✅ To‘xtab qolgan habar yuborishlar davom ettirildi: {resumed} ta")
+        except Exception as e:
+            print(f"❗ Habar yuborishlarni tekshirishda xatolik: {e}")
@@ -0,0 +1,207 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from aiogram import types
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.exceptions import RetryAfter
+import database
+from broadcast import RateLimiter, limiter as global_limiter
+
+# === SOZLAMALAR ===
+# Telegram bitta kanal/guruhga daqiqasiga ~20 xabar ruxsat beradi
+CHANNEL_POSTS_PER_MINUTE = float(os.getenv("CHANNEL_POSTS_PER_MINUTE", "20"))
+POST_MAX_RETRIES = 3
+FIELDS = ("code", "channel", "reklama_id", "post_count", "title")
+
+_running = set()
+
+
+class ImportRow:
+    __slots__ = ("line", "code", "channel", "reklama_id", "post_count", "title", "error", "posted", "errors")
+
+    def __init__(self, line, values=None, error=None):
+        self.line = line
+        self.code = self.channel = self.title = None
+        self.reklama_id = self.post_count = None
+        self.error = error
+        self.posted = 0
+        self.errors = []
+        if values is not None and error is None:
+            self._validate([str(v).strip() for v in values])
+
+    def _validate(self, values):
+        if len(values) < 5 or not all(values[:5]):
+            self.error = "5 ta maydon kerak: KOD @kanal REKLAMA_ID POST_SONI ANIME_NOMI"
+            return
+        code, channel, reklama_id, post_count, title = values[:5]
+        if not (code.isdigit() and reklama_id.isdigit() and post_count.isdigit()):
+            self.error = "KOD, REKLAMA_ID va POST_SONI raqam bo‘lishi kerak"
+            return
+        self.code = code
+        self.channel = channel
+        self.reklama_id = int(reklama_id)
+        self.post_count = int(post_count)
+        self.title = title
+
+
+# === O'QISH ===
+def parse_text(text):
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        parts = line.strip().split()
+        if not parts:
+            continue
+        rows.append(ImportRow(line_no, parts[:4] + [" ".join(parts[4:])]))
+    return rows
+
+
+def parse_csv(text):
+    sample = text[:2048]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = []
+    for line_no, values in enumerate(csv.reader(io.StringIO(text), dialect), 1):
+        if not any(v.strip() for v in values):
+            continue
+        if line_no == 1 and not values[0].strip().isdigit():
+            continue  # sarlavha qatori
+        rows.append(ImportRow(line_no, values))
+    return rows
+
+
+def parse_json(text):
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("rows", [])
+    if not isinstance(data, list):
+        raise ValueError("JSON ro‘yxat bo‘lishi kerak")
+    rows = []
+    for index, item in enumerate(data, 1):
+        if isinstance(item, dict):
+            rows.append(ImportRow(index, [item.get(field, "") for field in FIELDS]))
+        elif isinstance(item, list):
+            rows.append(ImportRow(index, item))
+        else:
+            rows.append(ImportRow(index, error="Noto‘g‘ri element"))
+    return rows
+
+
+def parse_document(file_name, raw):
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Fayl UTF-8 kodlashda bo‘lishi kerak")
+    if file_name.lower().endswith(".json"):
+        try:
+            return parse_json(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON xato: {e}")
+    return parse_csv(text)
+
+
+def mark_duplicates(rows):
+    seen = set()
+    for row in rows:
+        if row.error:
+            continue
+        if row.code in seen:
+            row.error = f"Takroriy kod: {row.code}"
+        seen.add(row.code)
+    return rows
+
+
+async def save_rows(rows):
+    """Barcha to'g'ri qatorlarni bitta tranzaksiyada yozadi."""
+    valid = [row for row in mark_duplicates(rows) if not row.error]
+    if valid:
+        await database.add_kino_codes_bulk([
+            (row.code, row.channel, row.reklama_id + 1, row.post_count, row.title) for row in valid
+        ])
+    return valid
+
+
+# === KANALLARGA JOYLASH ===
+def download_button(bot_username, code):
+    return InlineKeyboardMarkup().add(
+        InlineKeyboardButton("✨Yuklab olish✨", url=f"https://t.me/{bot_username}?start={code}")
+    )
+
+
+async def post_rows(bot, rows, targets, bot_username):
+    """Har kanal uchun alohida navbat: kanallar parallel, kanal ichida tezlik cheklangan."""
+
+    async def channel_worker(channel_id):
+        channel_limiter = RateLimiter(CHANNEL_POSTS_PER_MINUTE / 60, burst=1)
+        for row in rows:
+            for _ in range(POST_MAX_RETRIES):
+                await channel_limiter.acquire()
+                await global_limiter.acquire()
+                try:
+                    await bot.copy_message(
+                        channel_id, row.channel, row.reklama_id,
+                        reply_markup=download_button(bot_username, row.code)
+                    )
+                    row.posted += 1
+                    break
+                except RetryAfter as e:
+                    channel_limiter.pause(e.timeout)
+                except Exception as e:
+                    row.errors.append(f"{channel_id}: {e}")
+                    break
+            else:
+                row.errors.append(f"{channel_id}: flood limit")
+
+    await asyncio.gather(*(channel_worker(channel_id) for channel_id in targets))
+
+
+def render_report(rows, targets_count):
+    saved = sum(1 for row in rows if not row.error)
+    failed_rows = len(rows) - saved
+    posted = sum(row.posted for row in rows)
+    post_errors = sum(len(row.errors) for row in rows)
+    lines = [
+        "📥 Import natijasi:",
+        f"✅ Saqlandi: {saved} ta kod",
+        f"❌ Xato qatorlar: {failed_rows} ta",
+        f"📤 Kanallarga: {posted} ta, xato: {post_errors} ta",
+        "",
+    ]
+    for row in rows:
+        if row.error:
+            lines.append(f"❌ {row.line}-qator: {row.error}")
+        else:
+            line = f"✅ {row.code} – {row.title}: {row.posted}/{targets_count} kanal"
+            if row.errors:
+                line += " ⚠️ " + "; ".join(row.errors)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+async def send_report(bot, chat_id, rows, targets_count, reply_markup=None):
+    text = render_report(rows, targets_count)
+    if len(text) <= 3500:
+        await bot.send_message(chat_id, text, reply_markup=reply_markup)
+        return
+    summary = "\n".join(text.split("\n", 4)[:4])
+    document = types.InputFile(io.BytesIO(text.encode("utf-8")), filename="import_report.txt")
+    await bot.send_document(chat_id, document, caption=summary, reply_markup=reply_markup)
+
+
+async def _post_and_report(bot, chat_id, rows, targets, bot_username):
+    valid = [row for row in rows if not row.error]
+    try:
+        await post_rows(bot, valid, targets, bot_username)
+    finally:
+        await send_report(bot, chat_id, rows, len(targets))
+
+
+def start_posting(bot, chat_id, rows, targets, bot_username):
+    """Kanallarga joylashni fon rejimida boshlaydi, tugagach hisobot yuboradi."""
+    task = asyncio.create_task(_post_and_report(bot, chat_id, rows, targets, bot_username))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
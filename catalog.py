@@ -0,0 +1,70 @@
+import os
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from database import get_codes_page, get_kino_version
+import metrics
+from router import router
+
+# === SOZLAMALAR ===
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "50"))
+# 50 qator * 70 belgi Telegramning 4096 chegarasidan oshmaydi
+CATALOG_TITLE_LIMIT = 60
+
+
+class CatalogPage:
+    __slots__ = ("text", "markup", "empty")
+
+    def __init__(self, text, markup, empty):
+        self.text = text
+        self.markup = markup
+        self.empty = empty
+
+
+# (yo'nalish, kalit) -> CatalogPage; katalog versiyasi o'zgarsa tozalanadi
+_pages = {}
+_pages_version = None
+
+
+def _render(rows, has_prev, has_next):
+    text = "📄 *Barcha animelar:*\n\n"
+    for row in rows:
+        title = row["title"] or ""
+        if len(title) > CATALOG_TITLE_LIMIT:
+            title = title[:CATALOG_TITLE_LIMIT - 1] + "…"
+        text += f"`{row['code']}` – *{title}*\n"
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("◀️", callback_data=router.pack("catalog", "p", rows[0]["code"])))
+    if has_next:
+        buttons.append(InlineKeyboardButton("▶️", callback_data=router.pack("catalog", "n", rows[-1]["code"])))
+    markup = InlineKeyboardMarkup(row_width=2).row(*buttons) if buttons else None
+    return CatalogPage(text, markup, not rows)
+
+
+async def get_catalog_page(direction=None, key=None):
+    """Katalog sahifasi: keshdan yoki bitta kichik so'rov bilan."""
+    global _pages_version
+    version = get_kino_version()
+    if version != _pages_version:
+        _pages.clear()
+        _pages_version = version
+
+    cache_key = (direction, key)
+    page = _pages.get(cache_key)
+    if page is not None:
+        metrics.cache_hit("catalog_pages")
+    else:
+        metrics.cache_miss("catalog_pages")
+        if direction == "p":
+            rows, has_prev, has_next = await get_codes_page(before=key, limit=CATALOG_PAGE_SIZE)
+            if not rows:
+                return await get_catalog_page()
+        elif direction == "n":
+            rows, has_prev, has_next = await get_codes_page(after=key, limit=CATALOG_PAGE_SIZE)
+            if not rows:
+                return await get_catalog_page()
+        else:
+            rows, has_prev, has_next = await get_codes_page(limit=CATALOG_PAGE_SIZE)
+        page = _render(rows, has_prev, has_next)
+        _pages[cache_key] = page
+    return page
@@ -0,0 +1,83 @@
+import asyncio
+import os
+from types import MappingProxyType
+import database
+from subscription import subscriptions
+
+# === SOZLAMALAR ===
+# Boshqa jarayonlardagi o'zgarishlarni tekshirish oralig'i (soniya)
+CHANNELS_REFRESH_INTERVAL = float(os.getenv("CHANNELS_REFRESH_INTERVAL", "10"))
+
+
+# === O'ZGARMAS SNAPSHOT ===
+class ChannelGroup:
+    """Bir turdagi kanallar: tartib saqlanadi, ID bo'yicha qidiruv O(1)."""
+    __slots__ = ("ids", "links")
+
+    def __init__(self, pairs):
+        self.ids = tuple(channel_id for channel_id, _ in pairs)
+        self.links = MappingProxyType(dict(pairs))
+
+    def __contains__(self, channel_id):
+        return channel_id in self.links
+
+    def __len__(self):
+        return len(self.ids)
+
+    def items(self):
+        return [(channel_id, self.links[channel_id]) for channel_id in self.ids]
+
+
+class ChannelSnapshot:
+    __slots__ = ("version", "sub", "main")
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.sub = ChannelGroup([(r["channel_id"], r["link"]) for r in rows if r["kind"] == "sub"])
+        self.main = ChannelGroup([(r["channel_id"], r["link"]) for r in rows if r["kind"] == "main"])
+
+    def group(self, kind):
+        return self.sub if kind == "sub" else self.main
+
+
+# O'quvchilar qulfsiz: yangi snapshot bitta o'zlashtirish bilan almashtiriladi
+_snapshot = ChannelSnapshot(None, [])
+_reload_lock = asyncio.Lock()
+
+
+def current():
+    return _snapshot
+
+
+async def reload():
+    global _snapshot
+    async with _reload_lock:
+        version, rows = await database.get_channels()
+        previous, _snapshot = _snapshot, ChannelSnapshot(version, rows)
+    # Olib tashlangan kanal (shu yoki boshqa jarayonda) obuna keshida qolmasin
+    for channel_id in set(previous.sub.ids + previous.main.ids):
+        if channel_id not in _snapshot.sub and channel_id not in _snapshot.main:
+            subscriptions.forget(channel_id=channel_id)
+    return _snapshot
+
+
+async def add(kind, channel_id, link):
+    added = await database.add_channel(kind, channel_id, link)
+    await reload()
+    return added
+
+
+async def remove(kind, channel_id):
+    deleted = await database.delete_channel(kind, channel_id)
+    await reload()
+    return deleted
+
+
+async def refresh_loop():
+    while True:
+        await asyncio.sleep(CHANNELS_REFRESH_INTERVAL)
+        try:
+            if await database.get_channels_version() != _snapshot.version:
+                await reload()
+        except Exception as e:
+            print(f"❗ Kanallar ro‘yxatini yangilashda xatolik: {e}")
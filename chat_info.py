@@ -0,0 +1,88 @@
+import asyncio
+import os
+from aiogram.types import InlineKeyboardButton
+import metrics
+
+# === SOZLAMALAR ===
+# Kanal nomlari fon rejimida shuncha soniyada bir yangilanadi
+CHAT_INFO_REFRESH_INTERVAL = int(os.getenv("CHAT_INFO_REFRESH_INTERVAL", "3600"))
+
+
+class ChatInfo:
+    __slots__ = ("title", "invite_link")
+
+    def __init__(self, title, invite_link):
+        self.title = title
+        self.invite_link = invite_link
+
+
+# === KANAL MA'LUMOTLARI KESHI ===
+class ChatInfoCache:
+    """bot.get_chat natijalari (nom, taklif havolasi) va tayyor homiy tugmalari keshi."""
+
+    def __init__(self):
+        self._info = {}     # channel_id -> ChatInfo
+        self._buttons = {}  # tuple((kanal, havola)) -> tuple(InlineKeyboardButton)
+
+    async def _fetch(self, bot, channel_id):
+        chat = await bot.get_chat(channel_id)
+        info = ChatInfo(chat.title, getattr(chat, "invite_link", None))
+        self._info[channel_id] = info
+        return info
+
+    def invalidate(self, channel_id=None):
+        """Kanal qo'shilganda/o'chirilganda chaqiriladi."""
+        if channel_id is None:
+            self._info.clear()
+        else:
+            self._info.pop(channel_id, None)
+        self._buttons.clear()
+
+    async def sponsor_buttons(self, bot, channels, links):
+        """Obuna bo'linmagan kanallar uchun "➕ nom" tugmalari (kanallar to'plami bo'yicha keshlanadi)."""
+        key = tuple((channel_id, links.get(channel_id)) for channel_id in channels)
+        buttons = self._buttons.get(key)
+        if buttons is not None:
+            metrics.cache_hit("sponsor_buttons")
+            return buttons
+        metrics.cache_miss("sponsor_buttons")
+
+        missing = [channel_id for channel_id in channels if channel_id not in self._info]
+        results = await asyncio.gather(
+            *(self._fetch(bot, channel_id) for channel_id in missing), return_exceptions=True
+        )
+        complete = True
+        for channel_id, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"❗ Kanal tugmasini yaratishda xatolik: {channel_id} -> {result}")
+                complete = False
+
+        buttons = []
+        for channel_id, link in key:
+            info = self._info.get(channel_id)
+            link = link or (info.invite_link if info else None)
+            if info is None or not link:
+                continue
+            buttons.append(InlineKeyboardButton(f"➕ {info.title}", url=link))
+        buttons = tuple(buttons)
+        if complete:
+            self._buttons[key] = buttons
+        return buttons
+
+    async def refresh_loop(self, bot):
+        while True:
+            await asyncio.sleep(CHAT_INFO_REFRESH_INTERVAL)
+            changed = False
+            for channel_id, old in list(self._info.items()):
+                try:
+                    info = await self._fetch(bot, channel_id)
+                except Exception as e:
+                    print(f"❗ Kanal ma'lumotini yangilashda xatolik: {channel_id} -> {e}")
+                    continue
+                if info.title != old.title or info.invite_link != old.invite_link:
+                    changed = True
+            if changed:
+                self._buttons.clear()
+
+
+chat_info = ChatInfoCache()
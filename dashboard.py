@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+import database
+import metrics
+
+# === SOZLAMALAR ===
+# Snapshot shuncha soniya yangi hisoblanadi: panel necha marta ochilmasin, bitta so'rov
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_TTL", "30"))
+DASHBOARD_TOP = 5
+DASHBOARD_TITLE_LIMIT = 40
+
+
+class DashboardSnapshot:
+    __slots__ = ("text", "taken_at")
+
+    def __init__(self, text, taken_at):
+        self.text = text
+        self.taken_at = taken_at
+
+
+def _short(title, code):
+    title = title or code
+    if len(title) > DASHBOARD_TITLE_LIMIT:
+        title = title[:DASHBOARD_TITLE_LIMIT - 1] + "…"
+    return title
+
+
+def render(data):
+    lines = [
+        f"📦 Kodlar: {data['codes']}",
+        f"👥 Foydalanuvchilar: {data['users'] or 0}",
+        f"🆕 Bugun qo‘shilganlar: {data['today'] or 0}",
+        f"🔍 Jami qidiruvlar: {data['searched']}",
+        f"👁 Jami ko‘rishlar: {data['viewed']}",
+    ]
+    for header, key in (("🔥 Eng ko‘p qidirilgan:", "top_searched"), ("🏆 Eng ko‘p ko‘rilgan:", "top_viewed")):
+        if not data[key]:
+            continue
+        lines += ["", header]
+        for place, item in enumerate(data[key], 1):
+            lines.append(f"{place}. {item['code']} – {_short(item['title'], item['code'])} ({item['count']})")
+    return "\n".join(lines)
+
+
+# === SNAPSHOT XIZMATI ===
+class Dashboard:
+    """TTL bilan keshlangan panel; bir vaqtdagi so'rovlar bitta hisoblashni kutadi."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._inflight = None
+
+    async def _compute(self):
+        data = await database.get_dashboard_stats(DASHBOARD_TOP)
+        self._snapshot = DashboardSnapshot(render(data), time.monotonic())
+        return self._snapshot
+
+    async def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.taken_at < DASHBOARD_TTL:
+            metrics.cache_hit("dashboard")
+            return snapshot
+        metrics.cache_miss("dashboard")
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._compute())
+        # shield: kutayotgan handler bekor qilinsa ham umumiy hisoblash davom etadi
+        return await asyncio.shield(self._inflight)
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+dashboard = Dashboard()
@@ -1,22 +1,148 @@
+import asyncio
 import asyncpg
+import json
 import os
+import time
+from array import array
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from datetime import date
+from datetime import date, timedelta
+import metrics
+from idset import IdSet
 
 load_dotenv()
 
 db_pool = None
 
+# Kodlar keshini DB bilan solishtirish oralig'i (soniya)
+KINO_REFRESH_INTERVAL = int(os.getenv("KINO_REFRESH_INTERVAL", "30"))
+# Bir vaqtda commit bo'lgan tranzaksiyalarni o'tkazib yubormaslik uchun zaxira oyna
+KINO_REFRESH_OVERLAP = timedelta(seconds=5)
+# kino_codes_deleted dagi belgilar shuncha vaqt saqlanadi; undan uzoq sinxronlanmagan
+# jarayon o'chirilgan kodlarni to'liq ro'yxat bilan solishtirib aniqlaydi
+KINO_DELETED_RETENTION = timedelta(hours=int(os.getenv("KINO_DELETED_RETENTION_HOURS", "24")))
+# Statistika buferini DB ga yozish oralig'i (soniya) va kodlar soni chegarasi
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_FLUSH_THRESHOLD = int(os.getenv("STATS_FLUSH_THRESHOLD", "500"))
+# Yangi foydalanuvchilarni bazaga yozish oralig'i (soniya) va navbat chegarasi
+USERS_FLUSH_INTERVAL = float(os.getenv("USERS_FLUSH_INTERVAL", "2"))
+USERS_FLUSH_THRESHOLD = int(os.getenv("USERS_FLUSH_THRESHOLD", "200"))
+
+# === Ulanish rejimi ===
+# "pgbouncer" (standart) - transaction rejimidagi pgbouncer: nomli tayyorlangan
+# so'rovlar ulanishlar orasida yo'qoladi, shuning uchun kesh o'chiriladi.
+# "direct" - faqat pgbouncer'siz to'g'ridan-to'g'ri Postgres uchun yoqiladi:
+# tayyorlangan so'rovlar keshi, isitilgan pool.
+DB_MODE = os.getenv("DB_MODE", "pgbouncer")
+DB_SSL = os.getenv("DB_SSL", "require")  # lokal/test bazalar uchun "disable"
+# Rejim bo'yicha (min_size, max_size); pgbouncer pool_size dan oshmasligi kerak
+DB_POOL_SIZES = {"direct": (5, 20), "pgbouncer": (10, 10)}
+DB_POOL_MIN_SIZE = os.getenv("DB_POOL_MIN_SIZE")
+DB_POOL_MAX_SIZE = os.getenv("DB_POOL_MAX_SIZE")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Dastlabki adminlar: init_db ularni faqat bir marta yozadi (admins_seeded belgisi),
+# keyin olib tashlangan admin qayta ishga tushganda qaytib kelmaydi.
+# 7227368893 avval main.py dagi ADMINS to'plamida edi - jadvalga ko'chiriladi.
+DEFAULT_ADMINS = (6486825926, 7227368893)
+# admins jadvalidagi har bir o'zgarish shu kanalga NOTIFY qilinadi
+ADMINS_CHANNEL = "admins"
+# konkurs_participants.pos ni ketma-ket berish uchun advisory lock kaliti
+PARTICIPANTS_POS_LOCK = 0x6B6F6E6B
+
+# Issiq so'rovlar: direct rejimda har bir ulanishda oldindan tayyorlanadi
+SQL_GET_KINO = """
+    SELECT code, channel, message_id, post_count, title
+    FROM kino_codes
+    WHERE code = $1
+"""
+SQL_INSERT_USERS = """
+    INSERT INTO users (user_id)
+    SELECT unnest($1::bigint[])
+    ON CONFLICT DO NOTHING
+"""
+# Faqat mavjud kodlar yoziladi: o'chirilgan kodning buferdagi o'sishlari yetim qator yaratmaydi.
+# FOR KEY SHARE - parallel delete_kino_code shu yozuv tugashini kutadi (yoki u o'chirgan qator tushib qoladi)
+SQL_UPSERT_STATS = """
+    INSERT INTO stats (code, searched, viewed)
+    SELECT d.code, d.searched, d.viewed
+    FROM unnest($1::text[], $2::int[], $3::int[]) AS d(code, searched, viewed)
+    JOIN kino_codes k ON k.code = d.code
+    FOR KEY SHARE OF k
+    ON CONFLICT (code) DO UPDATE SET
+        searched = stats.searched + EXCLUDED.searched,
+        viewed = stats.viewed + EXCLUDED.viewed
+"""
+# (so'rov, zararsiz argumentlar) - bo'sh massivlar hech narsa yozmaydi
+WARM_STATEMENTS = (
+    (SQL_GET_KINO, ("",)),
+    (SQL_INSERT_USERS, ([],)),
+    (SQL_UPSERT_STATS, ([], [], [])),
+)
+
 # === Databasega ulanish ===
+@asynccontextmanager
+async def acquire():
+    """db_pool.acquire() + kutish vaqtini metrikaga yozish."""
+    started = time.perf_counter()
+    async with db_pool.acquire() as conn:
+        metrics.db_acquire_seconds.observe(time.perf_counter() - started)
+        yield conn
+
+
+def _pool_stat(getter):
+    return lambda: getter(db_pool) if db_pool is not None else None
+
+metrics.Gauge("db_pool_size", "Pooldagi ulanishlar soni", _pool_stat(lambda p: p.get_size()))
+metrics.Gauge("db_pool_idle", "Bo'sh ulanishlar soni", _pool_stat(lambda p: p.get_idle_size()))
+metrics.Gauge("db_pool_max_size", "Pool chegarasi", _pool_stat(lambda p: p.get_max_size()))
+
+
+def pool_options(mode=DB_MODE):
+    """asyncpg.create_pool uchun rejimga mos sozlamalar."""
+    if mode not in DB_POOL_SIZES:
+        raise ValueError(f"Noma'lum DB_MODE: {mode}")
+    min_size, max_size = DB_POOL_SIZES[mode]
+    options = {
+        "ssl": False if DB_SSL == "disable" else DB_SSL,
+        "min_size": int(DB_POOL_MIN_SIZE or min_size),
+        "max_size": int(DB_POOL_MAX_SIZE or max_size),
+    }
+    if mode == "pgbouncer":
+        # Avvalgi create_pool(statement_cache_size=0) sozlamalari bilan bir xil
+        options.update(statement_cache_size=0, max_inactive_connection_lifetime=300)
+    else:
+        # Isitilgan ulanishlar yopilmasin: ular bilan tayyorlangan so'rovlar ham yo'qoladi
+        options.update(statement_cache_size=DB_STATEMENT_CACHE_SIZE, max_inactive_connection_lifetime=0)
+    return options
+
+
+async def _warm_connection(conn):
+    for sql, args in WARM_STATEMENTS:
+        await conn.execute(sql, *args)
+
+
+async def warm_pool(pool):
+    """min_size ta ulanishni birga band qilib, issiq so'rovlarni har birida tayyorlaydi."""
+    conns = []
+    try:
+        for _ in range(pool.get_min_size()):
+            conns.append(await pool.acquire())
+        await asyncio.gather(*(_warm_connection(conn) for conn in conns))
+    finally:
+        for conn in conns:
+            await pool.release(conn)
+    return len(conns)
+
+
 async def init_db():
     global db_pool
     db_pool = await asyncpg.create_pool(
         dsn=os.getenv("DATABASE_URL"),  # faqat URL orqali ulanish
-        ssl="require",
-        statement_cache_size=0
+        **pool_options()
     )
 
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         # === Foydalanuvchilar ===
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -25,6 +151,65 @@ async def init_db():
             );
         """)
 
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS users_created_at_idx ON users (created_at);
+        """)
+
+        # === Foydalanuvchilar hisoblagichlari (trigger bilan yangilanadi) ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_counters (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                total BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_daily (
+                day DATE PRIMARY KEY,
+                joined INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        async with conn.transaction():
+            # Trigger o'rnatilguncha yangi qatorlar yozilmasin (backfill aniq bo'lishi uchun)
+            await conn.execute("LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE")
+            if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM user_counters)"):
+                await conn.execute("INSERT INTO user_counters (total) SELECT COUNT(*) FROM users")
+                await conn.execute("""
+                    INSERT INTO user_daily (day, joined)
+                    SELECT created_at::date, COUNT(*) FROM users
+                    WHERE created_at IS NOT NULL
+                    GROUP BY 1
+                    ON CONFLICT (day) DO UPDATE SET joined = EXCLUDED.joined
+                """)
+            # Statement darajasidagi trigger: flush_new_users ning bitta INSERT i = bitta yangilash
+            await conn.execute("""
+                CREATE OR REPLACE FUNCTION users_counters_insert() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE user_counters SET total = total + (SELECT COUNT(*) FROM new_rows);
+                    INSERT INTO user_daily (day, joined)
+                    SELECT created_at::date, COUNT(*) FROM new_rows
+                    WHERE created_at IS NOT NULL
+                    GROUP BY 1
+                    ON CONFLICT (day) DO UPDATE SET joined = user_daily.joined + EXCLUDED.joined;
+                    RETURN NULL;
+                END $$ LANGUAGE plpgsql;
+
+                CREATE OR REPLACE FUNCTION users_counters_delete() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE user_counters SET total = total - (SELECT COUNT(*) FROM old_rows);
+                    RETURN NULL;
+                END $$ LANGUAGE plpgsql;
+
+                DROP TRIGGER IF EXISTS users_counters_insert ON users;
+                CREATE TRIGGER users_counters_insert AFTER INSERT ON users
+                    REFERENCING NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_insert();
+
+                DROP TRIGGER IF EXISTS users_counters_delete ON users;
+                CREATE TRIGGER users_counters_delete AFTER DELETE ON users
+                    REFERENCING OLD TABLE AS old_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION users_counters_delete();
+            """)
+
         # === Anime kodlari ===
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS kino_codes (
@@ -35,6 +220,28 @@ async def init_db():
                 title TEXT
             );
         """)
+        await conn.execute("""
+            ALTER TABLE kino_codes
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS kino_codes_updated_at_idx ON kino_codes (updated_at);
+        """)
+        # Raqamli kodlar uchun (length, code) tartibi son tartibiga teng
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS kino_codes_order_idx ON kino_codes (length(code), code);
+        """)
+
+        # === O'chirilgan kodlar (boshqa jarayonlar keshini yangilash uchun) ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS kino_codes_deleted (
+                code TEXT PRIMARY KEY,
+                deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS kino_codes_deleted_at_idx ON kino_codes_deleted (deleted_at);
+        """)
 
         # === Statistika ===
         await conn.execute("""
@@ -51,70 +258,396 @@ async def init_db():
                 user_id BIGINT PRIMARY KEY
             );
         """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS admins_seeded (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton)
+            );
+        """)
+        async with conn.transaction():
+            # Bir vaqtda ishga tushgan jarayonlar triggerni navbat bilan yaratadi
+            await conn.execute("LOCK TABLE admins IN SHARE ROW EXCLUSIVE MODE")
+            # Trigger: qo'lda SQL bilan qilingan o'zgarishlar ham barcha jarayonlarga yetadi
+            await conn.execute(f"""
+                CREATE OR REPLACE FUNCTION admins_notify() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        PERFORM pg_notify('{ADMINS_CHANNEL}', 'remove:' || OLD.user_id);
+                    ELSE
+                        PERFORM pg_notify('{ADMINS_CHANNEL}', 'add:' || NEW.user_id);
+                    END IF;
+                    RETURN NULL;
+                END $$ LANGUAGE plpgsql;
+
+                DROP TRIGGER IF EXISTS admins_notify ON admins;
+                CREATE TRIGGER admins_notify AFTER INSERT OR DELETE ON admins
+                    FOR EACH ROW EXECUTE FUNCTION admins_notify();
+            """)
+
+        # === Kanallar (sub - majburiy obuna, main - asosiy) ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                id BIGSERIAL,
+                kind TEXT NOT NULL,
+                channel_id BIGINT NOT NULL,
+                link TEXT NOT NULL,
+                PRIMARY KEY (kind, channel_id)
+            );
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS channels_version (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                version BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+        await conn.execute("INSERT INTO channels_version DEFAULT VALUES ON CONFLICT DO NOTHING")
+
+        # === FSM holatlari (bir nechta bot jarayoni uchun umumiy) ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                chat_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                state TEXT,
+                data JSONB NOT NULL DEFAULT '{}',
+                bucket JSONB NOT NULL DEFAULT '{}',
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (chat_id, user_id)
+            );
+        """)
+
+        # === Konkurs ishtirokchilari ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS konkurs_participants (
+                user_id BIGINT PRIMARY KEY,
+                joined_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        # pos - 0 dan boshlanuvchi, bo'shliqsiz qo'shilish tartibi: g'olib tanlash
+        # tasodifiy o'rinlarni butun jadvalni raqamlamasdan indeks orqali oladi
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTICIPANTS_POS_LOCK)
+            await conn.execute("""
+                ALTER TABLE konkurs_participants ADD COLUMN IF NOT EXISTS pos BIGINT;
+            """)
+            await conn.execute("""
+                UPDATE konkurs_participants p SET pos = n.pos
+                FROM (
+                    SELECT user_id,
+                           (SELECT COALESCE(MAX(pos), -1) FROM konkurs_participants)
+                           + row_number() OVER (ORDER BY joined_at, user_id) AS pos
+                    FROM konkurs_participants WHERE pos IS NULL
+                ) n
+                WHERE p.user_id = n.user_id;
+            """)
+            await conn.execute("""
+                ALTER TABLE konkurs_participants ALTER COLUMN pos SET NOT NULL;
+            """)
+            await conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS konkurs_participants_pos_idx ON konkurs_participants (pos);
+            """)
+
+        # === Ommaviy xabar yuborish vazifalari ===
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id SERIAL PRIMARY KEY,
+                from_chat TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                admin_chat_id BIGINT NOT NULL,
+                status_message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'running',
+                last_user_id BIGINT NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                finished_at TIMESTAMPTZ
+            );
+        """)
 
-        # Dastlabki adminlar (o‘zingning ID’laringni yoz)
-        default_admins = [6486825926]
-        for admin_id in default_admins:
-            await conn.execute(
-                "INSERT INTO admins (user_id) VALUES ($1) ON CONFLICT DO NOTHING",
-                admin_id
+        # Dastlabki adminlar: belgi qo'yilgan birinchi ishga tushishda, bitta so'rovda
+        await conn.execute("""
+            WITH seeded AS (
+                INSERT INTO admins_seeded DEFAULT VALUES ON CONFLICT DO NOTHING RETURNING singleton
             )
+            INSERT INTO admins (user_id)
+            SELECT unnest($1::bigint[]) WHERE EXISTS (SELECT 1 FROM seeded)
+            ON CONFLICT DO NOTHING
+        """, list(DEFAULT_ADMINS))
+
+    # Jadvallar tayyor: endi issiq so'rovlarni oldindan tayyorlash mumkin
+    if DB_MODE == "direct":
+        await warm_pool(db_pool)
 
 
 # === Foydalanuvchilar bilan ishlash ===
+# Ma'lum foydalanuvchilar xotirada: qaytgan foydalanuvchi uchun /start bazaga
+# bormaydi, yangilari navbatga tushadi va flush_new_users() bilan yoziladi.
+_known_users = IdSet()  # ~8 bayt/foydalanuvchi (set'da int obyekti bilan ~70+)
+_new_users = set()
+_users_flush_lock = asyncio.Lock()
+_users_flush_task = None
+metrics.Gauge("known_users", "Xotiradagi ma'lum foydalanuvchilar", lambda: len(_known_users))
+metrics.Gauge("users_insert_queue", "Yozilishini kutayotgan yangi foydalanuvchilar", lambda: len(_new_users))
+
+async def load_known_users():
+    """users jadvalidagi barcha ID larni xotiraga yuklaydi (on_startup da)."""
+    known = array("q")
+    async with acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor("SELECT user_id FROM users ORDER BY user_id", prefetch=10000):
+                known.append(row["user_id"])
+    _known_users.extend_sorted(known)
+    return len(_known_users)
+
 async def add_user(user_id):
-    async with db_pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO users (user_id) VALUES ($1) ON CONFLICT DO NOTHING", user_id
-        )
+    global _users_flush_task
+    if user_id in _known_users:
+        metrics.cache_hit("known_users")
+        return
+    metrics.cache_miss("known_users")
+    _known_users.add(user_id)
+    _new_users.add(user_id)
+    if len(_new_users) >= USERS_FLUSH_THRESHOLD and (
+        _users_flush_task is None or _users_flush_task.done()
+    ):
+        _users_flush_task = asyncio.create_task(flush_new_users())
+
+async def flush_new_users():
+    global _new_users
+    async with _users_flush_lock:
+        if not _new_users:
+            return 0
+        batch, _new_users = _new_users, set()
+        try:
+            async with acquire() as conn:
+                await conn.execute(SQL_INSERT_USERS, list(batch))
+        except Exception:
+            _new_users |= batch
+            raise
+        return len(batch)
+
+async def users_flush_loop():
+    while True:
+        await asyncio.sleep(USERS_FLUSH_INTERVAL)
+        try:
+            await flush_new_users()
+        except Exception as e:
+            print(f"❗ Yangi foydalanuvchilarni yozishda xatolik: {e}")
+
 async def get_conn():
     global db_pool
     if db_pool is None:
         await init_db()
     return db_pool
     
+# Hisoblagichlar users jadvalidagi trigger bilan yuritiladi: COUNT(*) skan yo'q
 async def get_user_count():
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT COUNT(*) FROM users")
-        return row[0]
+    async with acquire() as conn:
+        return await conn.fetchval("SELECT total FROM user_counters") or 0
 
 async def get_today_users():
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         today = date.today()
-        row = await conn.fetchrow("""
-            SELECT COUNT(*) FROM users WHERE DATE(created_at) = $1
-        """, today)
-        return row[0] if row else 0
+        return await conn.fetchval("SELECT joined FROM user_daily WHERE day = $1", today) or 0
+
+async def get_user_growth(days=7):
+    """Oxirgi N kun: [(kun, qo'shilganlar, kun oxiridagi jami)] - bitta so'rov."""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT d::date AS day,
+                   COALESCE(u.joined, 0) AS joined,
+                   c.total - COALESCE(SUM(u.joined) OVER (
+                       ORDER BY d DESC ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ), 0) AS total
+            FROM generate_series($1::date - ($2::int - 1), $1::date, interval '1 day') d
+            LEFT JOIN user_daily u ON u.day = d::date
+            CROSS JOIN user_counters c
+            ORDER BY day
+        """, date.today(), days)
+        return [(row["day"], row["joined"], row["total"]) for row in rows]
+
+
+# === Kodlar keshi (kino_codes jadvalining jarayon ichidagi nusxasi) ===
+class KinoRecord:
+    """kino_codes qatori. row["channel"] ko'rinishida o'qish ham ishlaydi."""
+    __slots__ = ("code", "channel", "message_id", "post_count", "title")
+
+    def __init__(self, code, channel, message_id, post_count, title):
+        self.code = code
+        self.channel = channel
+        self.message_id = message_id
+        self.post_count = post_count
+        self.title = title
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+_kino_cache = {}
+_kino_synced_at = None
+_kino_version = 0  # katalog har o'zgarganda oshadi (sahifa keshlari uchun)
+
+def get_kino_version():
+    return _kino_version
+
+def _bump_kino_version():
+    global _kino_version
+    _kino_version += 1
+
+# O'zgarish tinglovchilari: callback(code, record) - record None bo'lsa kod o'chirilgan
+_kino_listeners = []
+
+def on_kino_change(callback):
+    _kino_listeners.append(callback)
+
+def _notify_kino(code, record):
+    for callback in _kino_listeners:
+        try:
+            callback(code, record)
+        except Exception as e:
+            print(f"❗ Kod o‘zgarishini qayta ishlashda xatolik: {code} -> {e}")
+
+def kino_records():
+    return list(_kino_cache.values())
+
+metrics.Gauge("kino_codes_cached", "Xotiradagi kodlar soni", lambda: len(_kino_cache))
+
+def _kino_from_row(row):
+    return KinoRecord(row["code"], row["channel"], row["message_id"], row["post_count"], row["title"])
+
+async def load_kino_cache():
+    """Butun kino_codes jadvalini xotiraga yuklaydi (on_startup da bir marta)."""
+    global _kino_cache, _kino_synced_at
+    async with acquire() as conn:
+        synced_at = await conn.fetchval("SELECT clock_timestamp()")
+        rows = await conn.fetch("""
+            SELECT code, channel, message_id, post_count, title
+            FROM kino_codes
+        """)
+    _kino_cache = {row["code"]: _kino_from_row(row) for row in rows}
+    _kino_synced_at = synced_at
+    _bump_kino_version()
+    return len(_kino_cache)
+
+async def refresh_kino_cache():
+    """Oxirgi sinxronlashdan keyin o'zgargan va o'chirilgan kodlarni qo'llaydi."""
+    global _kino_synced_at
+    if _kino_synced_at is None:
+        return await load_kino_cache()
+    since = _kino_synced_at - KINO_REFRESH_OVERLAP
+    async with acquire() as conn:
+        synced_at = await conn.fetchval("SELECT clock_timestamp()")
+        if synced_at - since < KINO_DELETED_RETENTION:
+            deleted = await conn.fetch(
+                "SELECT code FROM kino_codes_deleted WHERE deleted_at > $1", since
+            )
+            changed = await conn.fetch("""
+                SELECT code, channel, message_id, post_count, title
+                FROM kino_codes
+                WHERE updated_at > $1
+            """, since)
+        else:
+            # Kerakli belgilar tozalangan bo'lishi mumkin: butun jadval bilan solishtiramiz
+            changed = await conn.fetch("""
+                SELECT code, channel, message_id, post_count, title
+                FROM kino_codes
+            """)
+            live = {row["code"] for row in changed}
+            deleted = [{"code": code} for code in _kino_cache if code not in live]
+        # Eski belgilar hech bir jarayonga kerak emas: jadval cheksiz o'smaydi
+        await conn.execute(
+            "DELETE FROM kino_codes_deleted WHERE deleted_at < $1", synced_at - KINO_DELETED_RETENTION
+        )
+    # Avval o'chirilganlar, keyin o'zgarganlar: qayta qo'shilgan kod tiklanadi
+    for row in deleted:
+        if _kino_cache.pop(row["code"], None) is not None:
+            _notify_kino(row["code"], None)
+    for row in changed:
+        record = _kino_cache[row["code"]] = _kino_from_row(row)
+        _notify_kino(record.code, record)
+    _kino_synced_at = synced_at
+    if deleted or changed:
+        _bump_kino_version()
+    return len(deleted) + len(changed)
+
+async def kino_cache_refresh_loop():
+    while True:
+        await asyncio.sleep(KINO_REFRESH_INTERVAL)
+        try:
+            await refresh_kino_cache()
+        except Exception as e:
+            print(f"❗ Kodlar keshini yangilashda xatolik: {e}")
 
 
 # === Kodlar bilan ishlash ===
 async def add_kino_code(code, channel, message_id, post_count, title):
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         await conn.execute("""
-            INSERT INTO kino_codes (code, channel, message_id, post_count, title)
-            VALUES ($1, $2, $3, $4, $5)
+            INSERT INTO kino_codes (code, channel, message_id, post_count, title, updated_at)
+            VALUES ($1, $2, $3, $4, $5, now())
             ON CONFLICT (code) DO UPDATE SET
                 channel = EXCLUDED.channel,
                 message_id = EXCLUDED.message_id,
                 post_count = EXCLUDED.post_count,
-                title = EXCLUDED.title;
+                title = EXCLUDED.title,
+                updated_at = EXCLUDED.updated_at;
         """, code, channel, message_id, post_count, title)
         await conn.execute("""
             INSERT INTO stats (code) VALUES ($1)
             ON CONFLICT DO NOTHING
         """, code)
+    record = _kino_cache[code] = KinoRecord(code, channel, message_id, post_count, title)
+    _bump_kino_version()
+    _notify_kino(code, record)
+
+async def add_kino_codes_bulk(rows):
+    """rows: (code, channel, message_id, post_count, title) - bitta tranzaksiyada."""
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.executemany("""
+                INSERT INTO kino_codes (code, channel, message_id, post_count, title, updated_at)
+                VALUES ($1, $2, $3, $4, $5, now())
+                ON CONFLICT (code) DO UPDATE SET
+                    channel = EXCLUDED.channel,
+                    message_id = EXCLUDED.message_id,
+                    post_count = EXCLUDED.post_count,
+                    title = EXCLUDED.title,
+                    updated_at = EXCLUDED.updated_at;
+            """, rows)
+            await conn.execute("""
+                INSERT INTO stats (code) SELECT unnest($1::text[])
+                ON CONFLICT DO NOTHING
+            """, [row[0] for row in rows])
+    for row in rows:
+        record = _kino_cache[row[0]] = KinoRecord(*row)
+        _notify_kino(record.code, record)
+    _bump_kino_version()
 
 async def get_kino_by_code(code):
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow("""
-            SELECT code, channel, message_id, post_count, title
-            FROM kino_codes
-            WHERE code = $1
-        """, code)
+    if _kino_synced_at is not None:
+        record = _kino_cache.get(code)
+        if record is None:
+            metrics.cache_miss("kino_codes")
+        else:
+            metrics.cache_hit("kino_codes")
+        return record
+    async with acquire() as conn:
+        row = await conn.fetchrow(SQL_GET_KINO, code)
         return dict(row) if row else None
 
 async def get_all_codes():
-    async with db_pool.acquire() as conn:
+    if _kino_synced_at is not None:
+        return [record.to_dict() for record in _kino_cache.values()]
+    async with acquire() as conn:
         rows = await conn.fetch("""
             SELECT code, channel, message_id, post_count, title
             FROM kino_codes
@@ -130,61 +663,397 @@ async def get_all_codes():
             for row in rows
         ]
 
+async def get_codes_page(after=None, before=None, limit=50):
+    """Keyset sahifalash: (rows, has_prev, has_next). Tartib bazada bajariladi."""
+    async with acquire() as conn:
+        if before is not None:
+            rows = await conn.fetch("""
+                SELECT code, title FROM kino_codes
+                WHERE (length(code), code) < (length($1), $1)
+                ORDER BY length(code) DESC, code DESC
+                LIMIT $2
+            """, before, limit + 1)
+            has_prev = len(rows) > limit
+            return list(reversed(rows[:limit])), has_prev, True
+        if after is not None:
+            rows = await conn.fetch("""
+                SELECT code, title FROM kino_codes
+                WHERE (length(code), code) > (length($1), $1)
+                ORDER BY length(code), code
+                LIMIT $2
+            """, after, limit + 1)
+        else:
+            rows = await conn.fetch("""
+                SELECT code, title FROM kino_codes
+                ORDER BY length(code), code
+                LIMIT $1
+            """, limit + 1)
+        return rows[:limit], after is not None, len(rows) > limit
+
 async def delete_kino_code(code):
-    async with db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM stats WHERE code = $1", code)
-        result = await conn.execute("DELETE FROM kino_codes WHERE code = $1", code)
-        return result.endswith("1")
+    async with acquire() as conn:
+        async with conn.transaction():
+            # Avval kod: parallel flush_stats shu qatorni kutadi, so'ng stats ham tozalanadi
+            result = await conn.execute("DELETE FROM kino_codes WHERE code = $1", code)
+            await conn.execute("DELETE FROM stats WHERE code = $1", code)
+            await conn.execute("""
+                INSERT INTO kino_codes_deleted (code) VALUES ($1)
+                ON CONFLICT (code) DO UPDATE SET deleted_at = now()
+            """, code)
+    _kino_cache.pop(code, None)
+    _stats_pending.pop(code, None)
+    _bump_kino_version()
+    _notify_kino(code, None)
+    return result.endswith("1")
 
 
 # === Statistika bilan ishlash ===
+# increment_stat DB ga bormaydi: o'sishlar xotirada yig'iladi va
+# flush_stats() ularni bitta UPSERT bilan yozadi.
+_stats_pending = {}   # code -> [searched, viewed]
+_stats_inflight = {}  # hozir DB ga yozilayotgan to'plam
+_stats_flush_lock = asyncio.Lock()
+_stats_flush_task = None
+metrics.Gauge("stats_pending_codes", "Yozilmagan statistika kodlari", lambda: len(_stats_pending))
+
 async def increment_stat(code, field):
+    global _stats_flush_task
     if field not in ("searched", "viewed", "init"):
         return
-    async with db_pool.acquire() as conn:
-        if field == "init":
-            await conn.execute("""
-                INSERT INTO stats (code, searched, viewed) VALUES ($1, 0, 0)
-                ON CONFLICT DO NOTHING
-            """, code)
-        else:
-            await conn.execute(f"""
-                UPDATE stats SET {field} = {field} + 1 WHERE code = $1
-            """, code)
+    counters = _stats_pending.get(code)
+    if counters is None:
+        counters = _stats_pending[code] = [0, 0]
+    if field == "searched":
+        counters[0] += 1
+    elif field == "viewed":
+        counters[1] += 1
+    if len(_stats_pending) >= STATS_FLUSH_THRESHOLD and (
+        _stats_flush_task is None or _stats_flush_task.done()
+    ):
+        _stats_flush_task = asyncio.create_task(flush_stats())
+
+async def flush_stats():
+    """Yig'ilgan o'sishlarni bitta batched UPSERT bilan stats jadvaliga yozadi."""
+    global _stats_pending, _stats_inflight
+    async with _stats_flush_lock:
+        if not _stats_pending:
+            return 0
+        batch, _stats_pending = _stats_pending, {}
+        _stats_inflight = batch
+        codes = sorted(batch)  # qatorlar bir xil tartibda bloklanadi
+        try:
+            async with acquire() as conn:
+                await conn.execute(
+                    SQL_UPSERT_STATS, codes, [batch[c][0] for c in codes], [batch[c][1] for c in codes]
+                )
+        except Exception:
+            # Yozilmagan o'sishlarni keyingi urinish uchun qaytaramiz
+            for code, (searched, viewed) in batch.items():
+                counters = _stats_pending.setdefault(code, [0, 0])
+                counters[0] += searched
+                counters[1] += viewed
+            raise
+        finally:
+            _stats_inflight = {}
+        return len(codes)
+
+async def stats_flush_loop():
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            await flush_stats()
+        except Exception as e:
+            print(f"❗ Statistikani yozishda xatolik: {e}")
+
+async def get_searched_counts():
+    async with acquire() as conn:
+        rows = await conn.fetch("SELECT code, searched FROM stats WHERE searched > 0")
+        return {row["code"]: row["searched"] for row in rows}
+
+async def get_dashboard_stats(top=5):
+    """Admin paneli uchun barcha yig'indilar - bitta so'rov."""
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT
+                (SELECT COUNT(*) FROM kino_codes) AS codes,
+                (SELECT total FROM user_counters) AS users,
+                (SELECT joined FROM user_daily WHERE day = $1) AS today,
+                (SELECT COALESCE(SUM(searched), 0) FROM stats) AS searched,
+                (SELECT COALESCE(SUM(viewed), 0) FROM stats) AS viewed,
+                (SELECT COALESCE(json_agg(t), '[]') FROM (
+                    SELECT s.code, k.title, s.searched AS count
+                    FROM stats s LEFT JOIN kino_codes k ON k.code = s.code
+                    WHERE s.searched > 0
+                    ORDER BY s.searched DESC, s.code LIMIT $2
+                ) t) AS top_searched,
+                (SELECT COALESCE(json_agg(t), '[]') FROM (
+                    SELECT s.code, k.title, s.viewed AS count
+                    FROM stats s LEFT JOIN kino_codes k ON k.code = s.code
+                    WHERE s.viewed > 0
+                    ORDER BY s.viewed DESC, s.code LIMIT $2
+                ) t) AS top_viewed
+        """, date.today(), top)
+        result = dict(row)
+        result["top_searched"] = json.loads(result["top_searched"])
+        result["top_viewed"] = json.loads(result["top_viewed"])
+        return result
 
 async def get_code_stat(code):
-    async with db_pool.acquire() as conn:
-        return await conn.fetchrow("SELECT searched, viewed FROM stats WHERE code = $1", code)
+    async with acquire() as conn:
+        row = await conn.fetchrow("SELECT searched, viewed FROM stats WHERE code = $1", code)
+    pending = [0, 0]
+    for buffer in (_stats_pending, _stats_inflight):
+        counters = buffer.get(code)
+        if counters:
+            pending[0] += counters[0]
+            pending[1] += counters[1]
+    if row is None and code not in _stats_pending and code not in _stats_inflight:
+        return None
+    return {
+        "searched": (row["searched"] if row else 0) + pending[0],
+        "viewed": (row["viewed"] if row else 0) + pending[1],
+    }
 
 
 # === Kodni yangilash ===
 async def update_anime_code(old_code, new_code, new_title):
-    async with db_pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE kino_codes SET code = $1, title = $2 WHERE code = $3
-        """, new_code, new_title, old_code)
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                UPDATE kino_codes SET code = $1, title = $2, updated_at = now() WHERE code = $3
+            """, new_code, new_title, old_code)
+            if new_code != old_code:
+                await conn.execute("""
+                    INSERT INTO kino_codes_deleted (code) VALUES ($1)
+                    ON CONFLICT (code) DO UPDATE SET deleted_at = now()
+                """, old_code)
+    if new_code != old_code:
+        _stats_pending.pop(old_code, None)
+    record = _kino_cache.pop(old_code, None)
+    if record is not None:
+        _notify_kino(old_code, None)
+        record = _kino_cache[new_code] = KinoRecord(new_code, record.channel, record.message_id, record.post_count, new_title)
+        _notify_kino(new_code, record)
+    _bump_kino_version()
 
 
 # === Adminlar bilan ishlash ===
 async def get_all_admins():
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         rows = await conn.fetch("SELECT user_id FROM admins")
         return {row["user_id"] for row in rows}
 
 async def add_admin(user_id: int):
-    async with db_pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO admins (user_id) VALUES ($1) ON CONFLICT DO NOTHING",
+    """Yangi qo'shilgan bo'lsa True."""
+    async with acquire() as conn:
+        inserted = await conn.fetchval(
+            "INSERT INTO admins (user_id) VALUES ($1) ON CONFLICT DO NOTHING RETURNING user_id",
             user_id
         )
+    return inserted is not None
 
 async def remove_admin(user_id: int):
-    async with db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM admins WHERE user_id = $1", user_id)
+    """O'chirilgan bo'lsa True."""
+    async with acquire() as conn:
+        result = await conn.execute("DELETE FROM admins WHERE user_id = $1", user_id)
+    return result.endswith("1")
 
 
 # === Barcha foydalanuvchilarni olish ===
 async def get_all_user_ids():
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         rows = await conn.fetch("SELECT user_id FROM users")
         return [row["user_id"] for row in rows]
+
+
+# === Kanallar bilan ishlash ===
+async def get_channels():
+    """(version, rows) - kanallar qo'shilgan tartibda."""
+    async with acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            version = await conn.fetchval("SELECT version FROM channels_version")
+            rows = await conn.fetch("SELECT kind, channel_id, link FROM channels ORDER BY id")
+    return version, rows
+
+async def get_channels_version():
+    async with acquire() as conn:
+        return await conn.fetchval("SELECT version FROM channels_version")
+
+async def add_channel(kind, channel_id, link):
+    async with acquire() as conn:
+        async with conn.transaction():
+            inserted = await conn.fetchval("""
+                INSERT INTO channels (kind, channel_id, link) VALUES ($1, $2, $3)
+                ON CONFLICT DO NOTHING
+                RETURNING channel_id
+            """, kind, channel_id, link)
+            if inserted is not None:
+                await conn.execute("UPDATE channels_version SET version = version + 1")
+    return inserted is not None
+
+async def delete_channel(kind, channel_id):
+    async with acquire() as conn:
+        async with conn.transaction():
+            result = await conn.execute(
+                "DELETE FROM channels WHERE kind = $1 AND channel_id = $2", kind, channel_id
+            )
+            deleted = result.endswith("1")
+            if deleted:
+                await conn.execute("UPDATE channels_version SET version = version + 1")
+    return deleted
+
+
+# === Konkurs ishtirokchilari ===
+async def add_participant(user_id):
+    """Yangi qo'shilgan bo'lsa True (PRIMARY KEY takrorni atomik tarzda to'sadi)."""
+    async with acquire() as conn:
+        async with conn.transaction():
+            # pos = MAX(pos) + 1: bir vaqtdagi qo'shishlar navbat bilan, bo'shliq qolmaydi
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTICIPANTS_POS_LOCK)
+            inserted = await conn.fetchval("""
+                INSERT INTO konkurs_participants (user_id, pos)
+                SELECT $1, COALESCE(MAX(pos) + 1, 0) FROM konkurs_participants
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING user_id
+            """, user_id)
+    return inserted is not None
+
+async def add_participants(user_ids):
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTICIPANTS_POS_LOCK)
+            await conn.execute("""
+                INSERT INTO konkurs_participants (user_id, pos)
+                SELECT d.user_id, m.next_pos + row_number() OVER (ORDER BY d.ord) - 1
+                FROM (
+                    SELECT user_id, MIN(ord) AS ord
+                    FROM unnest($1::bigint[]) WITH ORDINALITY AS u(user_id, ord)
+                    WHERE NOT EXISTS (SELECT 1 FROM konkurs_participants p WHERE p.user_id = u.user_id)
+                    GROUP BY user_id
+                ) d,
+                (SELECT COALESCE(MAX(pos) + 1, 0) AS next_pos FROM konkurs_participants) m
+                ON CONFLICT (user_id) DO NOTHING
+            """, list(user_ids))
+
+async def count_participants():
+    async with acquire() as conn:
+        # pos bo'shliqsiz: MAX(pos) + 1 = soni, lekin indeksdan bitta qator o'qiladi
+        return await conn.fetchval("SELECT COALESCE(MAX(pos) + 1, 0) FROM konkurs_participants")
+
+async def get_participants_at(positions):
+    """{pozitsiya: user_id} - qo'shilish tartibidagi 0 dan boshlanuvchi o'rinlar (pos indeksi)."""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT pos, user_id FROM konkurs_participants WHERE pos = ANY($1::bigint[])
+        """, list(positions))
+        return {row["pos"]: row["user_id"] for row in rows}
+
+async def get_participant_ids():
+    async with acquire() as conn:
+        rows = await conn.fetch("SELECT user_id FROM konkurs_participants ORDER BY pos")
+        return [row["user_id"] for row in rows]
+
+
+# === Ommaviy xabar yuborish vazifalari ===
+async def iter_user_ids(after_user_id=0, prefetch=1000):
+    """users jadvalini server tomonidagi kursor orqali user_id tartibida oqim qilib beradi."""
+    async with acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(
+                "SELECT user_id FROM users WHERE user_id > $1 ORDER BY user_id",
+                after_user_id, prefetch=prefetch
+            ):
+                yield row["user_id"]
+
+async def create_broadcast_job(from_chat, message_id, admin_chat_id):
+    async with acquire() as conn:
+        return await conn.fetchrow("""
+            INSERT INTO broadcast_jobs (from_chat, message_id, admin_chat_id, total)
+            VALUES ($1, $2, $3, (SELECT COUNT(*) FROM users))
+            RETURNING *
+        """, from_chat, message_id, admin_chat_id)
+
+async def set_broadcast_status_message(job_id, status_message_id):
+    async with acquire() as conn:
+        await conn.execute(
+            "UPDATE broadcast_jobs SET status_message_id = $2 WHERE id = $1",
+            job_id, status_message_id
+        )
+
+async def save_broadcast_checkpoint(job_id, last_user_id, sent, failed):
+    async with acquire() as conn:
+        await conn.execute("""
+            UPDATE broadcast_jobs
+            SET last_user_id = $2, sent = $3, failed = $4, heartbeat_at = now()
+            WHERE id = $1
+        """, job_id, last_user_id, sent, failed)
+
+async def touch_broadcast_job(job_id):
+    async with acquire() as conn:
+        await conn.execute(
+            "UPDATE broadcast_jobs SET heartbeat_at = now() WHERE id = $1 AND status = 'running'", job_id
+        )
+
+async def finish_broadcast_job(job_id, status):
+    async with acquire() as conn:
+        await conn.execute("""
+            UPDATE broadcast_jobs SET status = $2, finished_at = now() WHERE id = $1
+        """, job_id, status)
+
+async def claim_stale_broadcast_jobs(stale_after):
+    """Hech bir jarayon yurgizmayotgan (heartbeat eskirgan) vazifalarni egallaydi."""
+    async with acquire() as conn:
+        return await conn.fetch("""
+            UPDATE broadcast_jobs SET heartbeat_at = now()
+            WHERE status = 'running' AND heartbeat_at < now() - $1::interval
+            RETURNING *
+        """, stale_after)
+
+
+# === LISTEN/NOTIFY (jarayonlar orasida kesh tozalash) ===
+# pgbouncer transaction rejimida LISTEN ishlamaydi: DATABASE_LISTEN_URL to'g'ridan-to'g'ri
+# Postgres manzili bo'lishi kerak (berilmasa DATABASE_URL ishlatiladi).
+LISTEN_RETRY_DELAY = 5
+_notify_callbacks = {}  # kanal -> [callback(payload)]
+_listen_reset_callbacks = []  # ulanish uzilsa: o'tkazib yuborilgan xabarlar o'rniga keshni tozalash
+_listen_conn = None
+
+def _dispatch_notification(conn, pid, channel, payload):
+    for callback in _notify_callbacks.get(channel, ()):
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"❗ NOTIFY {channel} ni qayta ishlashda xatolik: {e}")
+
+def listen(channel, callback, on_reset=None):
+    """listen_loop() ishga tushishidan oldin chaqiriladi."""
+    _notify_callbacks.setdefault(channel, []).append(callback)
+    if on_reset is not None:
+        _listen_reset_callbacks.append(on_reset)
+
+async def listen_loop():
+    global _listen_conn
+    while True:
+        closed = asyncio.Event()
+        try:
+            _listen_conn = await asyncpg.connect(
+                dsn=os.getenv("DATABASE_LISTEN_URL") or os.getenv("DATABASE_URL"),
+                ssl=pool_options()["ssl"],
+            )
+            _listen_conn.add_termination_listener(lambda conn: closed.set())
+            for channel in _notify_callbacks:
+                await _listen_conn.add_listener(channel, _dispatch_notification)
+            # Ulanish o'rnatilguncha kelgan o'zgarishlar ko'rinmagan bo'lishi mumkin
+            for callback in _listen_reset_callbacks:
+                callback()
+            await closed.wait()
+            print("❗ LISTEN ulanishi uzildi, qayta ulanamiz...")
+        except Exception as e:
+            print(f"❗ LISTEN ulanishida xatolik: {e}")
+        finally:
+            if _listen_conn is not None and not _listen_conn.is_closed():
+                await _listen_conn.close()
+            _listen_conn = None
+        for callback in _listen_reset_callbacks:
+            callback()
+        await asyncio.sleep(LISTEN_RETRY_DELAY)
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from collections import OrderedDict
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.exceptions import RetryAfter, NotFound
+from broadcast import limiter as global_limiter
+import metrics
+from router import router
+
+# === SOZLAMALAR ===
+# copyMessages bitta chaqiruvda shuncha qismni yuboradi (media group hajmi)
+EPISODE_BATCH_SIZE = 10
+# Bitta chatga ketma-ket to'plamlar orasidagi tanaffus (soniya)
+EPISODE_BATCH_DELAY = 1.0
+EPISODE_MAX_RETRIES = 3
+# Klaviaturaning bir sahifasidagi qismlar (Telegram: ko'pi bilan 100 ta tugma)
+EPISODE_PAGE_SIZE = 50
+EPISODE_KEYBOARD_CACHE_SIZE = 2048
+
+# Yuborish davom etayotgan foydalanuvchilar: bir vaqtda bittadan ortiq bo'lmaydi
+_sending = {}
+
+
+def episode_ranges(post_count, size=EPISODE_BATCH_SIZE):
+    """[(1, 10), (11, 20), (21, 24)] ko'rinishidagi oraliqlar."""
+    return [(start, min(start + size - 1, post_count)) for start in range(1, post_count + 1, size)]
+
+
+def bulk_buttons(code, post_count, first=1, last=None):
+    """"Hammasini yuborish" va first..last dagi 10 talik oraliq tugmalari (1 tadan ko'p qism bo'lsa)."""
+    if post_count < 2:
+        return [], None
+    last = post_count if last is None else last
+    ranges = [
+        InlineKeyboardButton(f"{start + first - 1}–{end + first - 1}",
+                             callback_data=router.pack("kinorange", code, start + first - 1, end + first - 1))
+        for start, end in episode_ranges(last - first + 1)
+        if end > start
+    ]
+    send_all = InlineKeyboardButton(f"📥 Hammasi ({post_count})", callback_data=router.pack("kinorange", code, 1, post_count))
+    return ranges, send_all
+
+
+# === Sahifali qismlar klaviaturasi ===
+# (code, sahifa, post_count) -> tayyor JSON. post_count kalitda: o'zgarsa eski yozuv ishlatilmaydi
+_keyboards = OrderedDict()
+
+
+def page_count(post_count):
+    return max(1, -(-post_count // EPISODE_PAGE_SIZE))
+
+
+def _build_keyboard(code, post_count, page):
+    first = page * EPISODE_PAGE_SIZE + 1
+    last = min(first + EPISODE_PAGE_SIZE - 1, post_count)
+    keyboard = InlineKeyboardMarkup(row_width=5)
+    keyboard.add(*(
+        InlineKeyboardButton(str(i), callback_data=router.pack("kino", code, i)) for i in range(first, last + 1)
+    ))
+    ranges, send_all = bulk_buttons(code, post_count, first, last)
+    if send_all:
+        keyboard.add(*ranges)
+        keyboard.row(send_all)
+    pages = page_count(post_count)
+    if pages > 1:
+        keyboard.row(
+            InlineKeyboardButton("◀️", callback_data=router.pack("kinopage", code, (page - 1) % pages)),
+            InlineKeyboardButton(f"📄 {page + 1}/{pages}", callback_data=router.pack("kinopage", code, page)),
+            InlineKeyboardButton("▶️", callback_data=router.pack("kinopage", code, (page + 1) % pages)),
+        )
+    return json.dumps(keyboard.to_python(), ensure_ascii=False)
+
+
+def episode_keyboard(code, post_count, page=0):
+    """Serializatsiya qilingan reply_markup (aiogram satrni o'zgartirmasdan yuboradi)."""
+    page = min(max(page, 0), page_count(post_count) - 1)
+    key = (code, page, post_count)
+    markup = _keyboards.get(key)
+    if markup is not None:
+        _keyboards.move_to_end(key)
+        metrics.cache_hit("episode_keyboards")
+        return markup
+    metrics.cache_miss("episode_keyboards")
+    markup = _keyboards[key] = _build_keyboard(code, post_count, page)
+    if len(_keyboards) > EPISODE_KEYBOARD_CACHE_SIZE:
+        _keyboards.popitem(last=False)
+    return markup
+
+
+async def _copy_batch(bot, user_id, channel, message_ids):
+    """Bitta copyMessages chaqiruvi; aiogram 2 da metod yo'q, shuning uchun bot.request.
+
+    Bittadan nusxalashda yuborilgan ID lar message_ids ro'yxatidan olib tashlanadi:
+    RetryAfter dan keyingi qayta urinish faqat qolganlarini yuboradi.
+    """
+    await global_limiter.acquire()
+    try:
+        await bot.request("copyMessages", {
+            "chat_id": user_id,
+            "from_chat_id": channel,
+            "message_ids": json.dumps(message_ids),
+        })
+    except NotFound:
+        # Eski lokal Bot API server metodni bilmaydi (404 "Not Found"): bittadan nusxalaymiz
+        while message_ids:
+            await global_limiter.acquire()
+            await bot.copy_message(user_id, channel, message_ids[0])
+            del message_ids[0]
+
+
+async def send_episodes(bot, user_id, record, start, end):
+    """start..end qismlarni EPISODE_BATCH_SIZE lik to'plamlarda yuboradi. Yuborilganlar soni."""
+    base_id = record["message_id"]
+    sent = 0
+    for batch_start, batch_end in episode_ranges(end - start + 1):
+        message_ids = [base_id + start + i - 2 for i in range(batch_start, batch_end + 1)]
+        batch_size = len(message_ids)
+        if sent:
+            await asyncio.sleep(EPISODE_BATCH_DELAY)
+        for _ in range(EPISODE_MAX_RETRIES):
+            try:
+                await _copy_batch(bot, user_id, record["channel"], message_ids)
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(e.timeout)
+        else:
+            sent += batch_size - len(message_ids)  # bittadan yuborilganlari
+            break
+        sent += batch_size
+    return sent
+
+
+async def _send_and_release(bot, user_id, record, start, end):
+    try:
+        await send_episodes(bot, user_id, record, start, end)
+    except Exception as e:
+        print(f"❗ Qismlarni yuborishda xatolik: {user_id} -> {e}")
+        try:
+            await bot.send_message(user_id, "❌ Qismlarni yuborishda xatolik yuz berdi.")
+        except Exception:
+            pass
+    finally:
+        _sending.pop(user_id, None)
+
+
+def start_sending(bot, user_id, record, start, end):
+    """Fon rejimida yuboradi; foydalanuvchida boshqa yuborish davom etsa False."""
+    if user_id in _sending:
+        return False
+    _sending[user_id] = asyncio.create_task(_send_and_release(bot, user_id, record, start, end))
+    return True
@@ -0,0 +1,146 @@
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from aiogram.dispatcher.storage import BaseStorage
+import database
+import metrics
+
+# === SOZLAMALAR ===
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# LISTEN ulanishi bo'lmagan holat uchun zaxira: yozuv shuncha soniyadan keyin qayta o'qiladi
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "60"))
+NOTIFY_CHANNEL = "fsm_states"
+
+_EMPTY = (None, "{}", "{}")  # (state, data_json, bucket_json)
+
+_SELECT = """
+    SELECT state, data::text, bucket::text FROM fsm_states
+    WHERE chat_id = $1 AND user_id = $2
+"""
+# Yozish va NOTIFY bitta so'rovda: boshqa jarayonlar keshidan shu yozuv o'chadi
+_UPSERT = """
+    WITH up AS (
+        INSERT INTO fsm_states AS f (chat_id, user_id, state, data, bucket)
+        VALUES ($1, $2, $3, COALESCE($4::jsonb, '{{}}'), COALESCE($5::jsonb, '{{}}'))
+        ON CONFLICT (chat_id, user_id) DO UPDATE SET {assignments}, updated_at = now()
+        RETURNING state, data, bucket
+    )
+    SELECT state, data::text, bucket::text, pg_notify($6, $7) FROM up
+"""
+_SET_STATE = _UPSERT.format(assignments="state = EXCLUDED.state")
+_SET_DATA = _UPSERT.format(assignments="data = EXCLUDED.data")
+_MERGE_DATA = _UPSERT.format(assignments="data = f.data || EXCLUDED.data")
+_RESET = _UPSERT.format(assignments="state = NULL, data = '{}'")
+_SET_BUCKET = _UPSERT.format(assignments="bucket = EXCLUDED.bucket")
+_MERGE_BUCKET = _UPSERT.format(assignments="bucket = f.bucket || EXCLUDED.bucket")
+# Bo'sh qolgan qator o'chiriladi - jadval faqat faol suhbatlar hajmida qoladi
+_DELETE_EMPTY = """
+    DELETE FROM fsm_states
+    WHERE chat_id = $1 AND user_id = $2 AND state IS NULL AND data = '{}' AND bucket = '{}'
+"""
+
+
+class PostgresStorage(BaseStorage):
+    """fsm_states jadvalidagi FSM holatlari + jarayon ichidagi write-through kesh.
+
+    O'qish keshdan (holati yo'q foydalanuvchilar ham keshlanadi), har bir yozish
+    darhol bazaga tushadi va NOTIFY orqali boshqa jarayonlar keshidan o'chiriladi.
+    """
+
+    def __init__(self, cache_size=FSM_CACHE_SIZE):
+        self._cache = OrderedDict()  # (chat, user) -> (entry, o'qilgan vaqt)
+        self._cache_size = cache_size
+        self._token = uuid.uuid4().hex[:12]  # o'zimizning NOTIFY larni ajratish uchun
+        database.listen(NOTIFY_CHANNEL, self._on_notify, on_reset=self._cache.clear)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _key(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    def _remember(self, key, entry):
+        self._cache[key] = (entry, time.monotonic())
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _on_notify(self, payload):
+        token, chat, user = payload.split(":")
+        if token != self._token:
+            self._cache.pop((int(chat), int(user)), None)
+
+    async def _load(self, key):
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < FSM_CACHE_TTL:
+            metrics.cache_hit("fsm_states")
+            return cached[0]
+        metrics.cache_miss("fsm_states")
+        async with database.acquire() as conn:
+            row = await conn.fetchrow(_SELECT, *key)
+        entry = tuple(row) if row else _EMPTY
+        # O'qish davomida shu jarayon yozgan bo'lsa, yangiroq yozuv saqlanib qoladi
+        if self._cache.get(key) is cached:
+            self._remember(key, entry)
+        return entry
+
+    async def _write(self, key, sql, state=None, data=None, bucket=None):
+        payload = f"{self._token}:{key[0]}:{key[1]}"
+        async with database.acquire() as conn:
+            row = await conn.fetchrow(sql, key[0], key[1], state, data, bucket, NOTIFY_CHANNEL, payload)
+            entry = tuple(row[:3])
+            if entry == _EMPTY:
+                await conn.execute(_DELETE_EMPTY, *key)
+        self._remember(key, entry)
+
+    # === Holat ===
+    async def get_state(self, *, chat=None, user=None, default=None):
+        state = (await self._load(self._key(chat, user)))[0]
+        return state if state is not None else self.resolve_state(default)
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        await self._write(self._key(chat, user), _SET_STATE, state=self.resolve_state(state))
+
+    # === Ma'lumotlar ===
+    async def get_data(self, *, chat=None, user=None, default=None):
+        return json.loads((await self._load(self._key(chat, user)))[1])
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        await self._write(self._key(chat, user), _SET_DATA, data=json.dumps(data or {}))
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        data = dict(data or {}, **kwargs)
+        await self._write(self._key(chat, user), _MERGE_DATA, data=json.dumps(data))
+
+    async def reset_state(self, *, chat=None, user=None, with_data=True):
+        key = self._key(chat, user)
+        if not with_data:
+            await self.set_state(chat=key[0], user=key[1], state=None)
+            return
+        entry = await self._load(key)
+        if entry[0] is None and entry[1] == "{}":
+            return  # finish() holatsiz foydalanuvchi uchun bazaga bormaydi
+        await self._write(key, _RESET)
+
+    # === Bucket (throttling) ===
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat=None, user=None, default=None):
+        return json.loads((await self._load(self._key(chat, user)))[2])
+
+    async def set_bucket(self, *, chat=None, user=None, bucket=None):
+        await self._write(self._key(chat, user), _SET_BUCKET, bucket=json.dumps(bucket or {}))
+
+    async def update_bucket(self, *, chat=None, user=None, bucket=None, **kwargs):
+        bucket = dict(bucket or {}, **kwargs)
+        await self._write(self._key(chat, user), _MERGE_BUCKET, bucket=json.dumps(bucket))
+
+    async def close(self):
+        self._cache.clear()
+
+    async def wait_closed(self):
+        pass
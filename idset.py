@@ -0,0 +1,50 @@
+import bisect
+from array import array
+
+# Shuncha yangi ID yig'ilganda ular saralangan bo'lakka aylanadi
+IDSET_RECENT_LIMIT = 65536
+
+
+class IdSet:
+    """Millionlab ID uchun ixcham to'plam: saralangan array('q') bo'laklari (8 bayt/ID).
+
+    Yangi ID lar avval kichik set'ga tushadi, u to'lganda saralangan bo'lakka
+    aylanadi; bo'laklar ikkilik hisoblagich kabi birlashadi (bir xil o'lchamdagilar
+    qo'shiladi). Qidiruv - bir necha bisect; butun to'plam faqat u ikki baravar
+    o'sganda qayta saralanadi.
+    """
+
+    def __init__(self, recent_limit=IDSET_RECENT_LIMIT):
+        self._runs = []  # kamayuvchi o'lchamdagi saralangan bo'laklar
+        self._recent = set()
+        self._recent_limit = recent_limit
+
+    def __len__(self):
+        return sum(map(len, self._runs)) + len(self._recent)
+
+    def __contains__(self, value):
+        if value in self._recent:
+            return True
+        for run in self._runs:
+            i = bisect.bisect_left(run, value)
+            if i < len(run) and run[i] == value:
+                return True
+        return False
+
+    def add(self, value):
+        if value in self:
+            return
+        self._recent.add(value)
+        if len(self._recent) >= self._recent_limit:
+            self._push(array("q", sorted(self._recent)))
+            self._recent = set()
+
+    def extend_sorted(self, run):
+        """O'sish tartibidagi, to'plamda hali yo'q ID lar (masalan ORDER BY user_id natijasi)."""
+        if run:
+            self._push(array("q", run))
+
+    def _push(self, run):
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = array("q", sorted(self._runs.pop() + run))
+        self._runs.append(run)
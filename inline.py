@@ -0,0 +1,149 @@
+import asyncio
+import html
+import json
+import os
+from collections import OrderedDict
+import database
+import metrics
+import search
+from bulk_import import download_button
+
+# === SOZLAMALAR ===
+# Telegram bitta javobda ko'pi bilan 50 ta natija qabul qiladi
+INLINE_PAGE_SIZE = 50
+INLINE_MAX_RESULTS = int(os.getenv("INLINE_MAX_RESULTS", "200"))
+# Telegram serveri bir xil so'rov javobini shuncha soniya o'zida saqlaydi
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+# Talab bo'yicha hisoblangan prefikslar soni (LRU)
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "4096"))
+# Shu uzunlikkacha bo'lgan prefikslar oldindan hisoblanadi: eng ko'p va eng og'ir so'rovlar
+INLINE_PRECOMPUTE_PREFIX = 2
+INLINE_REFRESH_INTERVAL = float(os.getenv("INLINE_REFRESH_INTERVAL", "5"))
+INLINE_QUERY_LIMIT = 64
+
+
+class InlineCache:
+    """Normallashtirilgan so'rov prefiksi -> tartiblangan (code, title) ro'yxati.
+
+    Qisqa prefikslar ("", "n", "na") oldindan hisoblanadi, qolganlari birinchi
+    so'rovda hisoblanib LRU da saqlanadi. Kodlar yoki mashhurlik o'zgarsa kesh
+    fonda qayta quriladi va bitta o'zlashtirish bilan almashtiriladi.
+
+    Sahifalar tayyor JSON qatori sifatida saqlanadi: aiogram satrni
+    (prepare_arg) o'zgartirmasdan yuboradi, 50 ta natijani har safar
+    serializatsiya qilish esa qidiruvning o'zidan qimmat.
+    """
+
+    def __init__(self):
+        self._precomputed = {}
+        self._lru = OrderedDict()
+        self._articles = {}  # code -> natija dict (bot username o'zgarmaydi)
+        self._pages = OrderedDict()  # (key, start) -> (results_json, next_offset)
+        self._built_for = None
+
+    def _state(self):
+        return database.get_kino_version(), search.index.popularity_version
+
+    @staticmethod
+    def key(query):
+        return " ".join(search.normalize(query[:INLINE_QUERY_LIMIT]))
+
+    @staticmethod
+    def _compute(key):
+        if not key:
+            return tuple(search.index.popular(INLINE_MAX_RESULTS))
+        return tuple(search.index.search(key, limit=INLINE_MAX_RESULTS))
+
+    async def rebuild(self):
+        state = self._state()
+        prefixes = {""}
+        for token in search.index.tokens():
+            for size in range(1, INLINE_PRECOMPUTE_PREFIX + 1):
+                prefixes.add(token[:size])
+        precomputed = {}
+        for i, prefix in enumerate(prefixes):
+            precomputed[prefix] = self._compute(prefix)
+            if i % 50 == 49:
+                await asyncio.sleep(0)
+        self._precomputed = precomputed
+        self._lru = OrderedDict()
+        self._pages = OrderedDict()
+        self._built_for = state
+        return len(precomputed)
+
+    def invalidate_code(self, code, record=None):
+        self._articles.pop(code, None)
+        self._pages = OrderedDict()
+
+    def results(self, query):
+        key = self.key(query)
+        found = self._precomputed.get(key)
+        if found is not None:
+            metrics.cache_hit("inline_queries")
+            return found
+        found = self._lru.get(key)
+        if found is not None:
+            self._lru.move_to_end(key)
+            metrics.cache_hit("inline_queries")
+            return found
+        metrics.cache_miss("inline_queries")
+        found = self._lru[key] = self._compute(key)
+        if len(self._lru) > INLINE_CACHE_SIZE:
+            self._lru.popitem(last=False)
+        return found
+
+    def _article(self, code, title, bot_username):
+        article = self._articles.get(code)
+        if article is None:
+            article = self._articles[code] = {
+                "type": "article",
+                "id": code,
+                "title": f"{code} – {title}",
+                "description": "✨ Yuklab olish uchun bosing",
+                "input_message_content": {
+                    "message_text": f"🎬 <b>{html.escape(title)}</b>\n🔢 Kod: <code>{code}</code>",
+                    "parse_mode": "HTML",
+                },
+                "reply_markup": download_button(bot_username, code).to_python(),
+            }
+        return article
+
+    def page(self, query, offset, bot_username):
+        """(results_json, next_offset) - next_offset bo'sh bo'lsa sahifalar tugagan."""
+        start = int(offset) if offset and offset.isdigit() else 0
+        page_key = (self.key(query), start)
+        cached = self._pages.get(page_key)
+        if cached is not None:
+            self._pages.move_to_end(page_key)
+            metrics.cache_hit("inline_pages")
+            return cached
+        metrics.cache_miss("inline_pages")
+        found = self.results(query)
+        end = start + INLINE_PAGE_SIZE
+        results = json.dumps(
+            [self._article(code, title, bot_username) for code, title in found[start:end]],
+            ensure_ascii=False,
+        )
+        cached = self._pages[page_key] = (results, str(end) if end < len(found) else "")
+        if len(self._pages) > INLINE_CACHE_SIZE:
+            self._pages.popitem(last=False)
+        return cached
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(INLINE_REFRESH_INTERVAL)
+            if self._state() == self._built_for:
+                continue
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"❗ Inline keshni yangilashda xatolik: {e}")
+
+
+inline_cache = InlineCache()
+
+
+async def load_inline_cache():
+    """Qidiruv indeksi yuklangandan keyin chaqiriladi (on_startup)."""
+    database.on_kino_change(inline_cache.invalidate_code)
+    return await inline_cache.rebuild()
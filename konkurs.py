@@ -1,14 +1,26 @@
+import asyncio
 import os
 import json
 import random
+import secrets
+from datetime import datetime, timezone
 from typing import List, Dict, Any
 from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
+from subscription import subscriptions
+import channels
+import database
+import admins
+from router import router
 
 # ==== ENV ====
-MAIN_CHANNELS = [c.strip() for c in (os.getenv("MAIN_CHANNELS") or "").split(",") if c.strip()]
+# Bazada asosiy kanallar bo'lmasa, eski MAIN_CHANNELS muhit o'zgaruvchisi ishlatiladi
+ENV_MAIN_CHANNELS = [c.strip() for c in (os.getenv("MAIN_CHANNELS") or "").split(",") if c.strip()]
+
+def main_channels():
+    return channels.current().main.ids or ENV_MAIN_CHANNELS
 
 # ==== FAYL YO'LLARI ====
 DATA_DIR = "participants"
@@ -18,20 +30,15 @@ CONTEST_FILE = os.path.join(DATA_DIR, "contest.json")
 # ==== FS ====
 def ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(PARTICIPANTS_FILE):
-        with open(PARTICIPANTS_FILE, "w", encoding="utf-8") as f:
-            json.dump({"participants": []}, f, indent=2, ensure_ascii=False)
     if not os.path.exists(CONTEST_FILE):
         with open(CONTEST_FILE, "w", encoding="utf-8") as f:
             json.dump({"active": False, "post_ids": [], "winners": []}, f, indent=2, ensure_ascii=False)
 
-def load_participants():
+def _read_legacy_participants():
+    if not os.path.exists(PARTICIPANTS_FILE):
+        return []
     with open(PARTICIPANTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_participants(data):
-    with open(PARTICIPANTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+        return json.load(f).get("participants", [])
 
 def load_contest():
     with open(CONTEST_FILE, "r", encoding="utf-8") as f:
@@ -41,6 +48,26 @@ def save_contest(data):
     with open(CONTEST_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
+# ==== ISHTIROKCHILAR ====
+# Manba - konkurs_participants jadvali; to'plam faqat takrorni tez aniqlash uchun
+_joined = set()
+
+async def load_participants():
+    """on_startup: eski participants.json ni bir marta ko'chiradi va to'plamni to'ldiradi."""
+    legacy = await asyncio.to_thread(_read_legacy_participants)
+    if legacy:
+        await database.add_participants(legacy)
+        await asyncio.to_thread(os.replace, PARTICIPANTS_FILE, PARTICIPANTS_FILE + ".imported")
+    _joined.update(await database.get_participant_ids())
+    return len(_joined)
+
+async def join_participant(user_id: int) -> bool:
+    if user_id in _joined:
+        return False
+    added = await database.add_participant(user_id)
+    _joined.add(user_id)
+    return added
+
 # ==== HOLATLAR ====
 class KonkursStates(StatesGroup):
     waiting_for_image = State()
@@ -50,10 +77,10 @@ class KonkursStates(StatesGroup):
 def konkurs_menu_kb():
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(
-        InlineKeyboardButton("🚀 Konkursni boshlash", callback_data="konkurs:start"),
-        InlineKeyboardButton("🏅 G‘olibni aniqlash", callback_data="konkurs:pick"),
-        InlineKeyboardButton("👥 Ishtirokchilar", callback_data="konkurs:participants"),
-        InlineKeyboardButton("⛔️ Konkursni yakunlash", callback_data="konkurs:finish"),
+        InlineKeyboardButton("🚀 Konkursni boshlash", callback_data=router.pack("konkurs", "start")),
+        InlineKeyboardButton("🏅 G‘olibni aniqlash", callback_data=router.pack("konkurs", "pick")),
+        InlineKeyboardButton("👥 Ishtirokchilar", callback_data=router.pack("konkurs", "participants")),
+        InlineKeyboardButton("⛔️ Konkursni yakunlash", callback_data=router.pack("konkurs", "finish")),
     )
     return kb
 
@@ -64,16 +91,55 @@ def participate_kb(bot_username: str):
 
 # ==== SUBS TEKSHIRUV ====
 async def is_user_subscribed(bot, user_id: int) -> bool:
-    if not MAIN_CHANNELS:
-        return True
-    for ch in MAIN_CHANNELS:
-        try:
-            member = await bot.get_chat_member(ch, user_id)
-            if getattr(member, "status", None) not in ("member", "administrator", "creator"):
-                return False
-        except:
-            return False
-    return True
+    return await subscriptions.is_subscribed(bot, user_id, main_channels())
+
+# ==== G'OLIB ANIQLASH ====
+DRAW_BATCH_SIZE = int(os.getenv("DRAW_BATCH_SIZE", "20"))
+DRAW_CONCURRENCY = int(os.getenv("DRAW_CONCURRENCY", "10"))
+# Shuncha partiyadan keyin mos nomzod topilmasa tanlov to'xtaydi (topilgan g'oliblar qaytadi)
+DRAW_MAX_ROUNDS = int(os.getenv("DRAW_MAX_ROUNDS", "50"))
+
+async def draw_winners(bot, count: int, exclude, seed: int = None) -> Dict[str, Any]:
+    """Seed bo'yicha qayta tiklanadigan tanlov.
+
+    Ishtirokchilar ro'yxati qurilmaydi: tasodifiy o'rinlar partiyalab olinadi,
+    obuna esa keshsiz, bir vaqtda DRAW_CONCURRENCY tagacha qayta tekshiriladi.
+    Mos nomzodlar kam bo'lsa, DRAW_MAX_ROUNDS partiyadan keyin to'xtaydi.
+    """
+    if seed is None:
+        seed = secrets.randbits(64)
+    rng = random.Random(seed)
+    total = await database.count_participants()
+    targets = main_channels()
+    exclude = set(exclude)
+    semaphore = asyncio.Semaphore(DRAW_CONCURRENCY)
+    seen = set()
+    winners: List[int] = []
+    skipped: List[int] = []
+
+    async def eligible(uid):
+        async with semaphore:
+            return await subscriptions.is_subscribed(bot, uid, targets, use_cache=False)
+
+    rounds = 0
+    while len(winners) < count and len(seen) < total and rounds < DRAW_MAX_ROUNDS:
+        rounds += 1
+        positions = []
+        while len(positions) < DRAW_BATCH_SIZE and len(seen) < total:
+            pos = rng.randrange(total)
+            if pos not in seen:
+                seen.add(pos)
+                positions.append(pos)
+        found = await database.get_participants_at(positions)
+        candidates = [found[pos] for pos in positions if pos in found and found[pos] not in exclude]
+        results = await asyncio.gather(*(eligible(uid) for uid in candidates))
+        for uid, ok in zip(candidates, results):
+            if not ok:
+                skipped.append(uid)
+            elif len(winners) < count:
+                winners.append(uid)
+
+    return {"seed": seed, "total": total, "winners": winners, "skipped": skipped}
 
 # ==== E'LON & DM ====
 async def announce_winners_to_channels(bot, winners: List[int]):
@@ -84,7 +150,7 @@ async def announce_winners_to_channels(bot, winners: List[int]):
     for i, uid in enumerate(winners[:3]):
         text += f"{medals[i]} <a href='tg://user?id={uid}'>{uid}</a>\n"
     ok = fail = 0
-    for ch in MAIN_CHANNELS:
+    for ch in main_channels():
         try:
             await bot.send_message(ch, text, parse_mode="HTML", disable_web_page_preview=True)
             ok += 1
@@ -106,31 +172,22 @@ async def dm_winners(bot, winners: List[int]):
             print(f"[dm_winner] {uid} -> {e}")
 
 # ==== HANDLERLAR ====
-def register_konkurs_handlers(dp, bot, ADMINS: set):
+def register_konkurs_handlers(dp, bot):
 
     ensure_dirs()
 
-    @dp.message_handler(commands=["start"])
+    @dp.message_handler(lambda m: (m.get_args() or "").strip() == "konkurs", commands=["start"])
     async def cmd_start(message: types.Message):
-        args = message.get_args().strip() if hasattr(message, "get_args") else ""
-        if args == "konkurs":
-            subscribed = await is_user_subscribed(message.bot, message.from_user.id)
-            if not subscribed:
-                await message.answer("❗️ Avval kanallarga obuna bo‘ling, so‘ngra qayta urinib ko‘ring.")
-                return
-            pdata = load_participants()
-            arr = pdata.get("participants", [])
-            if message.from_user.id not in arr:
-                arr.append(message.from_user.id)
-                pdata["participants"] = arr
-                save_participants(pdata)
-            await message.answer("✅ Ishtirok uchun rahmat! Siz ro‘yxatga qo‘shildingiz.")
+        subscribed = await is_user_subscribed(message.bot, message.from_user.id)
+        if not subscribed:
+            await message.answer("❗️ Avval kanallarga obuna bo‘ling, so‘ngra qayta urinib ko‘ring.")
             return
-        await message.answer("Salom! Bu bot konkurslar o‘tkazadi.")
+        await join_participant(message.from_user.id)
+        await message.answer("✅ Ishtirok uchun rahmat! Siz ro‘yxatga qo‘shildingiz.")
 
-    @dp.message_handler(lambda m: m.text == "🏆 Konkurs")
+    @router.text("🏆 Konkurs")
     async def open_konkurs_menu(message: types.Message):
-        if message.from_user.id not in ADMINS:
+        if not admins.is_admin(message.from_user.id):
             return
         st = load_contest()
         status = "🟢 Faol" if st.get("active") else "🔴 Faol emas"
@@ -138,18 +195,16 @@ def register_konkurs_handlers(dp, bot, ADMINS: set):
         win_line = f"\nG‘oliblar soni: {len(winners)}" if winners else ""
         await message.answer(f"🏆 Konkurs bo‘limi\nHolat: {status}{win_line}", reply_markup=konkurs_menu_kb())
 
-    @dp.callback_query_handler(lambda c: c.data.startswith("konkurs:"))
-    async def konkurs_menu_cb(callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in ADMINS:
+    @router.callback("konkurs", "z", str)
+    async def konkurs_menu_cb(callback: CallbackQuery, action, state: FSMContext):
+        if not admins.is_admin(callback.from_user.id):
             await callback.answer()
             return
-        _, action = callback.data.split(":", 1)
         if action == "start":
             await KonkursStates.waiting_for_image.set()
             await callback.message.answer("🖼 Konkurs post uchun rasm yuboring.")
         elif action == "participants":
-            data = load_participants()
-            ids = data.get("participants", [])
+            ids = await database.get_participant_ids()
             if not ids:
                 await callback.message.answer("ℹ️ Ishtirokchilar yo‘q.")
             else:
@@ -178,22 +233,39 @@ def register_konkurs_handlers(dp, bot, ADMINS: set):
             if not st.get("active"):
                 await callback.message.answer("ℹ️ Konkurs faol emas.")
                 return
-            pdata = load_participants()
-            participants = pdata.get("participants", [])
             winners = st.get("winners", [])
             if len(winners) >= 3:
                 await callback.message.answer("✅ 3 ta g‘olib tanlangan.")
                 return
-            candidates = [uid for uid in participants if uid not in winners]
-            if not candidates:
-                await callback.message.answer("❌ Nomzod qolmadi.")
+            await callback.answer("⏳ G‘oliblar aniqlanmoqda...")
+            draw = await draw_winners(callback.message.bot, 3 - len(winners), winners)
+            if not draw["winners"]:
+                await callback.message.answer("❌ Mos nomzod topilmadi.")
                 return
-            winner = random.choice(candidates)
-            winners.append(winner)
+            first = len(winners)
+            winners.extend(draw["winners"])
             st["winners"] = winners
+            draws = st.get("draws", [])
+            draws.append({
+                "seed": str(draw["seed"]),
+                "total": draw["total"],
+                "winners": draw["winners"],
+                "skipped": draw["skipped"],
+                "at": datetime.now(timezone.utc).isoformat(),
+            })
+            st["draws"] = draws
             save_contest(st)
             medals = ["🥇", "🥈", "🥉"]
-            await callback.message.answer(f"{medals[len(winners)-1]} G‘olib: <a href='tg://user?id={winner}'>{winner}</a>", parse_mode="HTML")
+            text = "\n".join(
+                f"{medals[first + i]} G‘olib: <a href='tg://user?id={uid}'>{uid}</a>"
+                for i, uid in enumerate(draw["winners"])
+            )
+            text += (
+                f"\n\n🎲 Seed: <code>{draw['seed']}</code>"
+                f"\n👥 Ishtirokchilar: {draw['total']}"
+                f"\n🚫 Obunasiz o‘tkazib yuborildi: {len(draw['skipped'])}"
+            )
+            await callback.message.answer(text, parse_mode="HTML")
             if len(winners) == 3:
                 st["active"] = False
                 save_contest(st)
@@ -203,7 +275,7 @@ def register_konkurs_handlers(dp, bot, ADMINS: set):
 
     @dp.message_handler(content_types=types.ContentType.PHOTO, state=KonkursStates.waiting_for_image)
     async def konkurs_get_image(message: types.Message, state: FSMContext):
-        if message.from_user.id not in ADMINS:
+        if not admins.is_admin(message.from_user.id):
             return
         await state.update_data(photo=message.photo[-1].file_id)
         await KonkursStates.waiting_for_caption.set()
@@ -211,12 +283,13 @@ def register_konkurs_handlers(dp, bot, ADMINS: set):
 
     @dp.message_handler(state=KonkursStates.waiting_for_caption)
     async def konkurs_get_caption_and_post(message: types.Message, state: FSMContext):
-        if message.from_user.id not in ADMINS:
+        if not admins.is_admin(message.from_user.id):
             return
         data = await state.get_data()
         photo_id = data.get("photo")
         caption = (message.text or "").strip()
-        if not MAIN_CHANNELS:
+        targets = main_channels()
+        if not targets:
             await message.answer("❌ MAIN_CHANNELS topilmadi.")
             await state.finish()
             return
@@ -228,7 +301,7 @@ def register_konkurs_handlers(dp, bot, ADMINS: set):
         me = await message.bot.get_me()
         kb = participate_kb(me.username)
         ok = fail = 0
-        for ch in MAIN_CHANNELS:
+        for ch in targets:
             try:
                 sent = await message.bot.send_photo(ch, photo=photo_id, caption=caption, reply_markup=kb)
                 st = load_contest()
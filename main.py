@@ -1,10 +1,11 @@
 # === IMPORTLAR ===
+import asyncio
 import io
 import os
 import time
 from datetime import datetime, date
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher, types
+from aiogram import Dispatcher, types
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
@@ -13,38 +14,79 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 )
 from aiogram.utils import executor
+from aiogram.utils.exceptions import MessageNotModified
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from keep_alive import keep_alive
+from fsm_storage import PostgresStorage
+from pipeline import UpdatePipeline
+from router import router
+from subscription import subscriptions
+from broadcast import start_broadcast, resume_broadcasts, resume_loop as broadcast_resume_loop
+from catalog import get_catalog_page
+from chat_info import chat_info
+import channels
+import admins
+import konkurs
+import bulk_import
+import search
+import episodes
+from dashboard import dashboard
+from inline import inline_cache, load_inline_cache, INLINE_CACHE_TIME
+from metrics import MetricsBot, MetricsMiddleware, Gauge
 from database import (
     init_db,
     add_user,
-    get_user_count,
-    add_kino_code,
     get_kino_by_code,
-    get_all_codes,
     delete_kino_code,
     get_code_stat,
     increment_stat,
-    get_all_user_ids,
     update_anime_code,
-    get_today_users
+    get_user_growth,
+    load_kino_cache,
+    kino_cache_refresh_loop,
+    flush_stats,
+    stats_flush_loop,
+    load_known_users,
+    flush_new_users,
+    users_flush_loop,
+    listen_loop
 )
 
 # === YUKLAMALAR ===
 load_dotenv()
-keep_alive()
 
 API_TOKEN = os.getenv("API_TOKEN")
-CHANNELS = []
-LINKS = []
-MAIN_CHANNELS = []
-MAIN_LINKS = []
+# "polling" (standart) yoki "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Test uchun soxta Bot API manzili (masalan: http://127.0.0.1:8081)
+BOT_API_SERVER = os.getenv("BOT_API_SERVER")
 BOT_USERNAME = os.getenv("BOT_USERNAME")
 
-bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+bot = MetricsBot(
+    token=API_TOKEN,
+    server=TelegramAPIServer.from_base(BOT_API_SERVER) if BOT_API_SERVER else TELEGRAM_PRODUCTION
+)
+# "postgres" (standart, jarayonlar orasida umumiy) yoki "memory" (faqat lokal sinov uchun)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+if FSM_STORAGE == "memory":
+    storage = MemoryStorage()
+    Gauge("fsm_storage_chats", "FSM xotirasidagi chatlar soni", lambda: len(storage.data))
+else:
+    storage = PostgresStorage()
+    Gauge("fsm_cache_entries", "FSM lokal keshidagi yozuvlar", lambda: len(storage))
 dp = Dispatcher(bot, storage=storage)
+dp.middleware.setup(MetricsMiddleware())
+# Barcha update'lar cheklangan navbat va workerlar orqali o'tadi
+pipeline = UpdatePipeline(dp, webhook=BOT_MODE == "webhook")
+
+# Adminlar admins jadvalidan: is_admin=True filtri har safar umumiy snapshotni o'qiydi
+dp.filters_factory.bind(admins.AdminFilter)
+
+# Tugma matnlari va callback'lar jadval orqali: raqamli kod handleridan oldin turadi
+router.register(dp, is_admin=admins.is_admin)
 
-ADMINS = {6486825926, 7227368893}
+# Konkurs handlerlari umumiy /start dan oldin ro‘yxatdan o‘tadi ("/start konkurs")
+konkurs.register_konkurs_handlers(dp, bot)
 
 # === KEYBOARDS ===
 def admin_keyboard():
@@ -99,46 +141,23 @@ class KanalStates(StatesGroup):
 
 # === OBUNA TEKSHIRISH ===
 async def get_unsubscribed_channels(user_id):
-    unsubscribed = []
-    for channel_id in CHANNELS:
-        try:
-            member = await bot.get_chat_member(channel_id, user_id)
-            if member.status not in ["member", "administrator", "creator"]:
-                unsubscribed.append(channel_id)
-        except Exception as e:
-            print(f"❗ Obuna tekshirishda xatolik: {channel_id} -> {e}")
-            unsubscribed.append(channel_id)
-    return unsubscribed
+    return await subscriptions.get_unsubscribed(bot, user_id, channels.current().sub.ids)
 
 async def is_user_subscribed(user_id):
-    for channel_id in CHANNELS:
-        try:
-            member = await bot.get_chat_member(channel_id, user_id)
-            if member.status not in ["member", "administrator", "creator"]:
-                return False
-        except Exception as e:
-            print(f"❗ Obuna holatini aniqlab bo‘lmadi: {channel_id} -> {e}")
-            return False
-    return True
+    return await subscriptions.is_subscribed(bot, user_id, channels.current().sub.ids)
 
 # === OBUNA BO‘LMAGANLAR MARKUP ===
-async def make_unsubscribed_markup(user_id, code):
-    unsubscribed = await get_unsubscribed_channels(user_id)
+async def make_unsubscribed_markup(user_id, code, unsubscribed=None, check_text="✅ Tekshirish"):
+    if unsubscribed is None:
+        unsubscribed = await get_unsubscribed_channels(user_id)
     markup = InlineKeyboardMarkup(row_width=1)
 
-    for idx, channel_id in enumerate(CHANNELS):
-        if channel_id in unsubscribed:
-            try:
-                chat = await bot.get_chat(channel_id)
-                channel_link = LINKS[idx]  # ID ga mos linkdan tugma yaratamiz
-                markup.add(
-                    InlineKeyboardButton(f"➕ {chat.title}", url=channel_link)
-                )
-            except Exception as e:
-                print(f"❗ Kanal tugmasini yaratishda xatolik: {channel_id} -> {e}")
+    # ID ga mos linkdan tugma yaratamiz (kanal nomlari keshdan olinadi)
+    for button in await chat_info.sponsor_buttons(bot, unsubscribed, channels.current().sub.links):
+        markup.add(button)
 
     # Tekshirish tugmasi
-    markup.add(InlineKeyboardButton("✅ Tekshirish", callback_data=f"checksub:{code}"))
+    markup.add(InlineKeyboardButton(check_text, callback_data=router.pack("checksub", code)))
     return markup
 
 
@@ -155,7 +174,7 @@ async def start_handler(message: types.Message):
 
         unsubscribed = await get_unsubscribed_channels(message.from_user.id)
         if unsubscribed:
-            markup = await make_unsubscribed_markup(message.from_user.id, code)
+            markup = await make_unsubscribed_markup(message.from_user.id, code, unsubscribed)
             await message.answer(
                 "❗ Animeni olishdan oldin quyidagi homiy kanal(lar)ga obuna bo‘ling:",
                 reply_markup=markup
@@ -165,34 +184,22 @@ async def start_handler(message: types.Message):
             await increment_stat(code, "searched")
         return
 
-    if message.from_user.id in ADMINS:
+    if admins.is_admin(message.from_user.id):
         await send_admin_panel(message)
     else:
         kb = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
         kb.add(KeyboardButton("🎞 Barcha animelar"), KeyboardButton("✉️ Admin bilan bog‘lanish"))
+        kb.add(KeyboardButton("🔎 Nomi bo‘yicha qidirish"))
         await message.answer("✨", reply_markup=kb)
 
 
 # === TEKSHIRUV CALLBACK ===
-@dp.callback_query_handler(lambda c: c.data.startswith("checksub:"))
-async def check_subscription_callback(call: CallbackQuery):
-    code = call.data.split(":")[1]
+@router.callback("checksub", "c", str)
+async def check_subscription_callback(call: CallbackQuery, code):
     unsubscribed = await get_unsubscribed_channels(call.from_user.id)
 
     if unsubscribed:
-        markup = InlineKeyboardMarkup(row_width=1)
-        for idx, channel_id in enumerate(CHANNELS):
-            if channel_id in unsubscribed:
-                try:
-                    chat = await bot.get_chat(channel_id)
-                    channel_link = LINKS[idx]
-                    markup.add(
-                        InlineKeyboardButton(f"➕ {chat.title}", url=channel_link)
-                    )
-                except Exception as e:
-                    print(f"❗ Kanal tugmasini qayta yaratishda xatolik: {channel_id} -> {e}")
-
-        markup.add(InlineKeyboardButton("✅ Yana tekshirish", callback_data=f"checksub:{code}"))
+        markup = await make_unsubscribed_markup(call.from_user.id, code, unsubscribed, "✅ Yana tekshirish")
         await call.message.edit_text("❗ Obuna bo‘lmagan kanal(lar):", reply_markup=markup)
     else:
         await call.message.delete()
@@ -201,22 +208,66 @@ async def check_subscription_callback(call: CallbackQuery):
 
 
 # === Barcha animelar ===
-@dp.message_handler(lambda m: m.text == "🎞 Barcha animelar")
+@router.text("🎞 Barcha animelar")
 async def show_all_animes(message: types.Message):
-    kodlar = await get_all_codes()
-    if not kodlar:
+    page = await get_catalog_page()
+    if page.empty:
         await message.answer("⛔️ Hozircha animelar yoʻq.")
         return
+    await message.answer(page.text, parse_mode="Markdown", reply_markup=page.markup)
+
 
-    kodlar = sorted(kodlar, key=lambda x: int(x["code"]))
-    text = "📄 *Barcha animelar:*\n\n"
-    for row in kodlar:
-        text += f"`{row['code']}` – *{row['title']}*\n"
-    await message.answer(text, parse_mode="Markdown")
+# === Katalog sahifalari ===
+@router.callback("catalog", "g", str, str)
+async def catalog_page_callback(callback: types.CallbackQuery, direction, key):
+    page = await get_catalog_page(direction, key)
+    try:
+        await callback.message.edit_text(page.text, parse_mode="Markdown", reply_markup=page.markup)
+    except Exception as e:
+        print(f"❗ Katalog sahifasini yangilashda xatolik: {e}")
+    await callback.answer()
+
+
+# === Nomi bo‘yicha qidirish ===
+@router.text("🔎 Nomi bo‘yicha qidirish")
+async def ask_anime_name(message: types.Message):
+    await SearchStates.waiting_for_anime_name.set()
+    await message.answer("🔎 Anime nomini yozing (xato bilan yozilsa ham topiladi):")
+
+@dp.message_handler(state=SearchStates.waiting_for_anime_name)
+async def search_anime_by_name(message: types.Message, state: FSMContext):
+    await state.finish()
+    query = (message.text or "").strip()
+    if query.isdigit():
+        await deliver_code(message.from_user.id, query)
+        return
+    results = search.index.search(query)
+    if not results:
+        await message.answer("❌ Hech narsa topilmadi. Boshqacha yozib ko‘ring.")
+        return
+    markup = InlineKeyboardMarkup(row_width=1)
+    for code, title in results:
+        markup.add(InlineKeyboardButton(f"{code} – {title}"[:64], callback_data=router.pack("search", code)))
+    await message.answer(f"🔎 Topildi: {len(results)} ta", reply_markup=markup)
+
+@router.callback("search", "s", str)
+async def search_result_callback(callback: types.CallbackQuery, code):
+    await callback.answer()
+    await deliver_code(callback.from_user.id, code)
+
+
+# === Inline rejim (@bot naruto) ===
+@dp.inline_handler()
+async def inline_search(inline_query: types.InlineQuery):
+    me = await bot.me
+    results, next_offset = inline_cache.page(inline_query.query, inline_query.offset, me.username)
+    await inline_query.answer(
+        results, cache_time=INLINE_CACHE_TIME, is_personal=False, next_offset=next_offset
+    )
 
 
 # === Admin bilan bog‘lanish ===
-@dp.message_handler(lambda m: m.text == "✉️ Admin bilan bog‘lanish")
+@router.text("✉️ Admin bilan bog‘lanish")
 async def contact_admin(message: types.Message):
     await UserStates.waiting_for_admin_message.set()
     await message.answer("✍️ Adminlarga yubormoqchi bo‘lgan xabaringizni yozing.\n\n❌ Bekor qilish uchun '❌ Bekor qilish' tugmasini bosing.", reply_markup=control_keyboard())
@@ -230,7 +281,7 @@ async def forward_to_admins(message: types.Message, state: FSMContext):
 
     await state.finish()
     user = message.from_user
-    for admin_id in ADMINS:
+    for admin_id in admins.current():
         try:
             keyboard = InlineKeyboardMarkup().add(
                 InlineKeyboardButton("✉️ Javob yozish", callback_data=f"reply_user:{user.id}")
@@ -249,30 +300,29 @@ async def forward_to_admins(message: types.Message, state: FSMContext):
 
 
 # === Kanal boshqaruvi menyusi ===
-@dp.message_handler(lambda m: m.text == "📡 Kanal boshqaruvi", user_id=ADMINS)
+@router.text("📡 Kanal boshqaruvi", admin_only=True)
 async def kanal_boshqaruvi(message: types.Message):
     kb = InlineKeyboardMarkup()
     kb.add(
-        InlineKeyboardButton("🔗 Majburiy obuna", callback_data="channel_type:sub"),
-        InlineKeyboardButton("📌 Asosiy kanallar", callback_data="channel_type:main")
+        InlineKeyboardButton("🔗 Majburiy obuna", callback_data=router.pack("channel_type", "sub")),
+        InlineKeyboardButton("📌 Asosiy kanallar", callback_data=router.pack("channel_type", "main"))
     )
     await message.answer("📡 Qaysi kanal turini boshqarasiz?", reply_markup=kb)
 
 
 # === Kanal turi tanlanadi ===
-@dp.callback_query_handler(lambda c: c.data.startswith("channel_type:"), user_id=ADMINS)
-async def select_channel_type(callback: types.CallbackQuery, state: FSMContext):
-    ctype = callback.data.split(":")[1]
+@router.callback("channel_type", "t", str, admin_only=True)
+async def select_channel_type(callback: types.CallbackQuery, ctype, state: FSMContext):
     await state.update_data(channel_type=ctype)
 
     kb = InlineKeyboardMarkup()
     kb.add(
-        InlineKeyboardButton("➕ Kanal qo‘shish", callback_data="action:add"),
-        InlineKeyboardButton("📋 Kanal ro‘yxati", callback_data="action:list")
+        InlineKeyboardButton("➕ Kanal qo‘shish", callback_data=router.pack("action", "add")),
+        InlineKeyboardButton("📋 Kanal ro‘yxati", callback_data=router.pack("action", "list"))
     )
     kb.add(
-        InlineKeyboardButton("❌ Kanal o‘chirish", callback_data="action:delete"),
-        InlineKeyboardButton("⬅️ Orqaga", callback_data="action:back")
+        InlineKeyboardButton("❌ Kanal o‘chirish", callback_data=router.pack("action", "delete")),
+        InlineKeyboardButton("⬅️ Orqaga", callback_data=router.pack("action", "back"))
     )
 
     text = "📡 Majburiy obuna kanallari menyusi:" if ctype == "sub" else "📌 Asosiy kanallar menyusi:"
@@ -281,9 +331,8 @@ async def select_channel_type(callback: types.CallbackQuery, state: FSMContext):
 
 
 # === Actionlarni boshqarish ===
-@dp.callback_query_handler(lambda c: c.data.startswith("action:"), user_id=ADMINS)
-async def channel_actions(callback: types.CallbackQuery, state: FSMContext):
-    action = callback.data.split(":")[1]
+@router.callback("action", "a", str, admin_only=True)
+async def channel_actions(callback: types.CallbackQuery, action, state: FSMContext):
     data = await state.get_data()
     ctype = data.get("channel_type")
 
@@ -296,37 +345,27 @@ async def channel_actions(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.answer("🆔 Kanal ID yuboring (masalan: -1001234567890):")
 
     elif action == "list":
-        if ctype == "sub":
-            channels = zip(CHANNELS, LINKS)
-            title = "📋 Majburiy obuna kanallari:\n\n"
-        else:
-            channels = zip(MAIN_CHANNELS, MAIN_LINKS)
-            title = "📌 Asosiy kanallar:\n\n"
+        group = channels.current().group(ctype)
+        title = "📋 Majburiy obuna kanallari:\n\n" if ctype == "sub" else "📌 Asosiy kanallar:\n\n"
 
-        if not list(channels):
+        if not group:
             await callback.message.answer("📭 Hali kanal yo‘q.")
         else:
             text = title + "\n".join(
-                f"{i}. 🆔 {cid}\n   🔗 {link}" for i, (cid, link) in enumerate(channels, 1)
+                f"{i}. 🆔 {cid}\n   🔗 {link}" for i, (cid, link) in enumerate(group.items(), 1)
             )
             await callback.message.answer(text)
 
     elif action == "delete":
-        if ctype == "sub":
-            channels = zip(CHANNELS, LINKS)
-            prefix = "del_sub"
-        else:
-            channels = zip(MAIN_CHANNELS, MAIN_LINKS)
-            prefix = "del_main"
+        group = channels.current().group(ctype)
 
-        channels = list(channels)
-        if not channels:
+        if not group:
             await callback.message.answer("📭 Hali kanal yo‘q.")
             return
 
         kb = InlineKeyboardMarkup()
-        for cid, link in channels:
-            kb.add(InlineKeyboardButton(f"O‘chirish: {cid}", callback_data=f"{prefix}:{cid}"))
+        for cid, link in group.items():
+            kb.add(InlineKeyboardButton(f"O‘chirish: {cid}", callback_data=router.pack("del", ctype, cid)))
         await callback.message.answer("❌ Qaysi kanalni o‘chirmoqchisiz?", reply_markup=kb)
 
     elif action == "back":
@@ -336,7 +375,7 @@ async def channel_actions(callback: types.CallbackQuery, state: FSMContext):
 
 
 # === 1. Kanal ID qabul qilish ===
-@dp.message_handler(state=KanalStates.waiting_for_channel_id, user_id=ADMINS)
+@dp.message_handler(state=KanalStates.waiting_for_channel_id, is_admin=True)
 async def add_channel_id(message: types.Message, state: FSMContext):
     try:
         channel_id = int(message.text.strip())
@@ -348,7 +387,7 @@ async def add_channel_id(message: types.Message, state: FSMContext):
 
 
 # === 2. Kanal linkini qabul qilish va saqlash ===
-@dp.message_handler(state=KanalStates.waiting_for_channel_link, user_id=ADMINS)
+@dp.message_handler(state=KanalStates.waiting_for_channel_link, is_admin=True)
 async def add_channel_finish(message: types.Message, state: FSMContext):
     data = await state.get_data()
     ctype = data.get("channel_type")
@@ -359,52 +398,37 @@ async def add_channel_finish(message: types.Message, state: FSMContext):
         await message.answer("❗ To‘liq link yuboring (masalan: https://t.me/...)")
         return
 
-    if ctype == "sub":
-        if channel_id in CHANNELS:
-            await message.answer("ℹ️ Bu kanal allaqachon qo‘shilgan.")
-        else:
-            CHANNELS.append(channel_id)
-            LINKS.append(channel_link)
-            await message.answer(f"✅ Kanal qo‘shildi!\n🆔 {channel_id}\n🔗 {channel_link}")
+    if not await channels.add(ctype, channel_id, channel_link):
+        await message.answer("ℹ️ Bu kanal allaqachon qo‘shilgan.")
+    elif ctype == "sub":
+        chat_info.invalidate(channel_id)
+        await message.answer(f"✅ Kanal qo‘shildi!\n🆔 {channel_id}\n🔗 {channel_link}")
     else:
-        if channel_id in MAIN_CHANNELS:
-            await message.answer("ℹ️ Bu kanal allaqachon qo‘shilgan.")
-        else:
-            MAIN_CHANNELS.append(channel_id)
-            MAIN_LINKS.append(channel_link)
-            await message.answer(f"✅ Asosiy kanal qo‘shildi!\n🆔 {channel_id}\n🔗 {channel_link}")
+        await message.answer(f"✅ Asosiy kanal qo‘shildi!\n🆔 {channel_id}\n🔗 {channel_link}")
 
     await state.finish()
 
 
 # === Kanalni o‘chirish ===
-@dp.callback_query_handler(lambda c: c.data.startswith("del_"), user_id=ADMINS)
-async def delete_channel(callback: types.CallbackQuery):
-    action, cid = callback.data.split(":")
-    cid = int(cid)
-
-    if action == "del_sub":
-        if cid in CHANNELS:
-            idx = CHANNELS.index(cid)
-            CHANNELS.pop(idx)
-            LINKS.pop(idx)
+@router.callback("del", "d", str, int, admin_only=True, legacy={"del_sub": ("sub",), "del_main": ("main",)})
+async def delete_channel(callback: types.CallbackQuery, ctype, cid):
+    if ctype == "sub":
+        if await channels.remove("sub", cid):
+            chat_info.invalidate(cid)
             await callback.message.answer(f"❌ Kanal o‘chirildi!\n🆔 {cid}")
-    elif action == "del_main":
-        if cid in MAIN_CHANNELS:
-            idx = MAIN_CHANNELS.index(cid)
-            MAIN_CHANNELS.pop(idx)
-            MAIN_LINKS.pop(idx)
+    elif ctype == "main":
+        if await channels.remove("main", cid):
             await callback.message.answer(f"❌ Asosiy kanal o‘chirildi!\n🆔 {cid}")
 
     await callback.answer("O‘chirildi ✅")
     
 # === Admin qo'shish ===
-@dp.message_handler(lambda m: m.text == "➕ Admin qo‘shish", user_id=ADMINS)
+@router.text("➕ Admin qo‘shish", admin_only=True)
 async def add_admin_start(message: types.Message):
     await AdminStates.waiting_for_admin_id.set()
     await message.answer("🆔 Yangi adminning Telegram ID raqamini yuboring.", reply_markup=control_keyboard())
 
-@dp.message_handler(state=AdminStates.waiting_for_admin_id, user_id=ADMINS)
+@dp.message_handler(state=AdminStates.waiting_for_admin_id, is_admin=True)
 async def add_admin_process(message: types.Message, state: FSMContext):
     if message.text == "📡 Boshqarish":
         await state.finish()
@@ -418,11 +442,10 @@ async def add_admin_process(message: types.Message, state: FSMContext):
         return
 
     new_admin_id = int(text)
-    if new_admin_id in ADMINS:
+    if not await admins.add(new_admin_id):
         await message.answer("ℹ️ Bu foydalanuvchi allaqachon admin.", reply_markup=control_keyboard())
         return
 
-    ADMINS.add(new_admin_id)
     await message.answer(f"✅ <code>{new_admin_id}</code> admin sifatida qo‘shildi.", parse_mode="HTML", reply_markup=control_keyboard())
     try:
         await bot.send_message(new_admin_id, "✅ Siz botga admin sifatida qo‘shildingiz.")
@@ -431,7 +454,7 @@ async def add_admin_process(message: types.Message, state: FSMContext):
 
 
 # === Kod statistikasi ===
-@dp.message_handler(lambda m: m.text == "📈 Kod statistikasi", user_id=ADMINS)
+@router.text("📈 Kod statistikasi", admin_only=True)
 async def ask_stat_code(message: types.Message):
     await AdminStates.waiting_for_stat_code.set()
     await message.answer("📥 Kod raqamini yuboring:", reply_markup=control_keyboard())
@@ -463,12 +486,12 @@ async def show_code_stat(message: types.Message, state: FSMContext):
 
 
 # === Kodni tahrirlash ===
-@dp.message_handler(lambda m: m.text == "✏️ Kodni tahrirlash", user_id=ADMINS)
+@router.text("✏️ Kodni tahrirlash", admin_only=True)
 async def edit_code_start(message: types.Message):
     await EditCode.WaitingForOldCode.set()
     await message.answer("Qaysi kodni tahrirlashni xohlaysiz? (eski kodni yuboring)", reply_markup=control_keyboard())
 
-@dp.message_handler(state=EditCode.WaitingForOldCode, user_id=ADMINS)
+@dp.message_handler(state=EditCode.WaitingForOldCode, is_admin=True)
 async def get_old_code(message: types.Message, state: FSMContext):
     if message.text == "📡 Boshqarish":
         await state.finish()
@@ -484,7 +507,7 @@ async def get_old_code(message: types.Message, state: FSMContext):
     await message.answer(f"🔎 Kod: {code}\n📌 Nomi: {post['title']}\n\nYangi kodni yuboring:", reply_markup=control_keyboard())
     await EditCode.WaitingForNewCode.set()
 
-@dp.message_handler(state=EditCode.WaitingForNewCode, user_id=ADMINS)
+@dp.message_handler(state=EditCode.WaitingForNewCode, is_admin=True)
 async def get_new_code(message: types.Message, state: FSMContext):
     if message.text == "📡 Boshqarish":
         await state.finish()
@@ -495,7 +518,7 @@ async def get_new_code(message: types.Message, state: FSMContext):
     await message.answer("Yangi nomini yuboring:", reply_markup=control_keyboard())
     await EditCode.WaitingForNewTitle.set()
 
-@dp.message_handler(state=EditCode.WaitingForNewTitle, user_id=ADMINS)
+@dp.message_handler(state=EditCode.WaitingForNewTitle, is_admin=True)
 async def get_new_title(message: types.Message, state: FSMContext):
     if message.text == "📡 Boshqarish":
         await state.finish()
@@ -513,7 +536,7 @@ async def get_new_title(message: types.Message, state: FSMContext):
 
 
 # === Kodni o'chirish ===
-@dp.message_handler(lambda m: m.text == "❌ Kodni o‘chirish", user_id=ADMINS)
+@router.text("❌ Kodni o‘chirish", admin_only=True)
 async def ask_delete_code(message: types.Message):
     await AdminStates.waiting_for_delete_code.set()
     await message.answer("🗑 Qaysi kodni o‘chirmoqchisiz? Kodni yuboring.", reply_markup=control_keyboard())
@@ -538,7 +561,7 @@ async def delete_code_handler(message: types.Message, state: FSMContext):
 
 
 # === Post qilish ===
-@dp.message_handler(lambda m: m.text == "📤 Post qilish", user_id=ADMINS)
+@router.text("📤 Post qilish", admin_only=True)
 async def start_post_process(message: types.Message):
     await PostStates.waiting_for_image.set()
     await message.answer("🖼 Iltimos, post uchun rasm yoki video yuboring (video 60 sekunddan oshmasin).", reply_markup=control_keyboard())
@@ -608,10 +631,14 @@ async def get_post_link(message: types.Message, state: FSMContext):
 
 
 # === Anime qo'shish ===
-@dp.message_handler(lambda m: m.text == "➕ Anime qo‘shish", user_id=ADMINS)
+@router.text("➕ Anime qo‘shish", admin_only=True)
 async def add_start(message: types.Message):
     await AdminStates.waiting_for_kino_data.set()
-    await message.answer("📝 Format: `KOD @kanal REKLAMA_ID POST_SONI ANIME_NOMI`\nMasalan: `91 @MyKino 4 12 naruto`", parse_mode="Markdown", reply_markup=control_keyboard())
+    await message.answer(
+        "📝 Format: `KOD @kanal REKLAMA_ID POST_SONI ANIME_NOMI`\nMasalan: `91 @MyKino 4 12 naruto`\n\n"
+        "📎 Ko‘p qatorli matn yoki CSV/JSON fayl ham yuborish mumkin.",
+        parse_mode="Markdown", reply_markup=control_keyboard()
+    )
 
 @dp.message_handler(state=AdminStates.waiting_for_kino_data)
 async def add_kino_handler(message: types.Message, state: FSMContext):
@@ -620,94 +647,102 @@ async def add_kino_handler(message: types.Message, state: FSMContext):
         await send_admin_panel(message)
         return
 
-    rows = message.text.strip().split("\n")
-    successful = 0
-    failed = 0
-    for row in rows:
-        parts = row.strip().split()
-        if len(parts) < 5:
-            failed += 1
-            continue
-        code, server_channel, reklama_id, post_count = parts[:4]
-        title = " ".join(parts[4:])
-        if not (code.isdigit() and reklama_id.isdigit() and post_count.isdigit()):
-            failed += 1
-            continue
-        reklama_id = int(reklama_id)
-        post_count = int(post_count)
-        await add_kino_code(code, server_channel, reklama_id + 1, post_count, title)
-        download_btn = InlineKeyboardMarkup().add(
-            InlineKeyboardButton("✨Yuklab olish✨", url=f"https://t.me/{BOT_USERNAME}?start={code}")
-        )
-        for ch in MAIN_CHANNELS:
-            try:
-                await bot.copy_message(ch, server_channel, reklama_id, reply_markup=download_btn)
-                successful += 1
-            except:
-                failed += 1
-
-    await message.answer(f"✅ Yangi kodlar qo‘shildi:\n\n✅ Muvaffaqiyatli: {successful}\n❌ Xatolik: {failed}", reply_markup=admin_keyboard())
+    await import_kino_rows(message, state, bulk_import.parse_text(message.text))
+
+@dp.message_handler(content_types=types.ContentType.DOCUMENT, state=AdminStates.waiting_for_kino_data)
+async def add_kino_document(message: types.Message, state: FSMContext):
+    buffer = await bot.download_file_by_id(message.document.file_id)
+    try:
+        rows = bulk_import.parse_document(message.document.file_name or "", buffer.getvalue())
+    except ValueError as e:
+        await message.answer(f"❌ Faylni o‘qib bo‘lmadi: {e}", reply_markup=control_keyboard())
+        return
+    await import_kino_rows(message, state, rows)
+
+async def import_kino_rows(message: types.Message, state: FSMContext, rows):
     await state.finish()
+    if not rows:
+        await message.answer("❗ Qatorlar topilmadi.", reply_markup=admin_keyboard())
+        return
+    valid = await bulk_import.save_rows(rows)
+    targets = channels.current().main.ids
+    await message.answer(
+        f"✅ Yangi kodlar qo‘shildi: {len(valid)} ta\n❌ Xato qatorlar: {len(rows) - len(valid)} ta"
+        + ("\n📤 Kanallarga joylanmoqda, tugagach hisobot yuboriladi." if valid and targets else ""),
+        reply_markup=admin_keyboard()
+    )
+    if valid and targets:
+        bulk_import.start_posting(bot, message.chat.id, rows, targets, BOT_USERNAME)
+    else:
+        await bulk_import.send_report(bot, message.chat.id, rows, len(targets))
 
 
 # === Kodlar ro'yxati ===
-@dp.message_handler(lambda m: m.text == "📄 Kodlar ro‘yxati")
-async def show_all_animes(message: types.Message):
-    kodlar = await get_all_codes()
-    if not kodlar:
+@router.text("📄 Kodlar ro‘yxati")
+async def show_codes_list(message: types.Message):
+    page = await get_catalog_page()
+    if page.empty:
         await message.answer("Ba'zada hech qanday kodlar yo'q!")
         return
-    kodlar = sorted(kodlar, key=lambda x: int(x["code"]))
-    chunk_size = 100
-    for i in range(0, len(kodlar), chunk_size):
-        chunk = kodlar[i:i + chunk_size]
-        text = "📄 *Barcha animelar:*\n\n"
-        for row in chunk:
-            text += f"`{row['code']}` – *{row['title']}*\n"
-        await message.answer(text, parse_mode="Markdown")
+    await message.answer(page.text, parse_mode="Markdown", reply_markup=page.markup)
 
 
 # === Statistika
-@dp.message_handler(lambda m: m.text == "📊 Statistika")
+@router.text("📊 Statistika", admin_only=True)
 async def stats(message: types.Message):
-    kodlar = await get_all_codes()
-    foydalanuvchilar = await get_user_count()
-    await message.answer(f"📦 Kodlar: {len(kodlar)}\n👥 Foydalanuvchilar: {foydalanuvchilar}")
+    snapshot = await dashboard.get()
+    await message.answer(snapshot.text)
+
+# === Foydalanuvchilar o‘sishi (/growth 30) ===
+GROWTH_MAX_DAYS = 90
+
+@dp.message_handler(commands=["growth"], is_admin=True)
+async def user_growth(message: types.Message):
+    args = (message.get_args() or "").strip()
+    days = min(int(args), GROWTH_MAX_DAYS) if args.isdigit() and int(args) > 0 else 7
+    rows = await get_user_growth(days)
+    text = f"📈 Oxirgi {days} kun:\n\n"
+    for day, joined, total in rows:
+        text += f"{day:%d.%m}: +{joined} (jami {total})\n"
+    await message.answer(text)
 
 # === Orqaga tugmasi ===
-@dp.message_handler(lambda m: m.text == "⬅️ Orqaga", user_id=ADMINS)
+@router.text("⬅️ Orqaga", admin_only=True)
 async def back_to_admin_menu(message: types.Message):
     await send_admin_panel(message)
 
 
 # === Qo'llanma ===
-@dp.message_handler(lambda m: m.text == "📘 Qo‘llanma")
-async def qollanma(message: types.Message):
+def help_keyboard():
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(
-        InlineKeyboardButton("📥 1. Anime qo‘shish", callback_data="help_add"),
-        InlineKeyboardButton("📡 2. Kanal yaratish", callback_data="help_channel"),
-        InlineKeyboardButton("🆔 3. Reklama ID olish", callback_data="help_id"),
-        InlineKeyboardButton("🔁 4. Kod ishlashi", callback_data="help_code"),
-        InlineKeyboardButton("❓ 5. Savol-javob", callback_data="help_faq")
+        InlineKeyboardButton("📥 1. Anime qo‘shish", callback_data=router.pack("help", "add")),
+        InlineKeyboardButton("📡 2. Kanal yaratish", callback_data=router.pack("help", "channel")),
+        InlineKeyboardButton("🆔 3. Reklama ID olish", callback_data=router.pack("help", "id")),
+        InlineKeyboardButton("🔁 4. Kod ishlashi", callback_data=router.pack("help", "code")),
+        InlineKeyboardButton("❓ 5. Savol-javob", callback_data=router.pack("help", "faq"))
     )
+    return kb
+
+@router.text("📘 Qo‘llanma")
+async def qollanma(message: types.Message):
+    kb = help_keyboard()
     await message.answer("📘 Qanday yordam kerak?", reply_markup=kb)
 
 
 # === Qo'llanma sahifalari ===
 HELP_TEXTS = {
-    "help_add": ("📥 *Anime qo‘shish*\n\n`KOD @kanal REKLAMA_ID POST_SONI ANIME_NOMI`\n\nMisol: `91 @MyKino 4 12 Naruto`\n\n• *Kod* – foydalanuvchi yozadigan raqam\n• *@kanal* – server kanal username\n• *REKLAMA_ID* – post ID raqami (raqam)\n• *POST_SONI* – nechta qism borligi\n• *ANIME_NOMI* – ko‘rsatiladigan sarlavha\n\n📩 Endi formatda xabar yuboring:"),
-    "help_channel": ("📡 *Kanal yaratish*\n\n1. 2 ta kanal yarating:\n   • *Server kanal* – post saqlanadi\n   • *Reklama kanal* – bot ulashadi\n\n2. Har ikkasiga botni admin qiling\n\n3. Kanalni public (@username) qiling"),
-    "help_id": ("🆔 *Reklama ID olish*\n\n1. Server kanalga post joylang\n\n2. Post ustiga bosing → *Share* → *Copy link*\n\n3. Link oxiridagi sonni oling\n\nMisol: `t.me/MyKino/4` → ID = `4`"),
-    "help_code": ("🔁 *Kod ishlashi*\n\n1. Foydalanuvchi kod yozadi (masalan: `91`)\n\n2. Obuna tekshiriladi → reklama post yuboriladi\n\n3. Tugmalar orqali qismlarni ochadi"),
-    "help_faq": ("❓ *Tez-tez so‘raladigan savollar*\n\n• *Kodni qanday ulashaman?*\n  `https://t.me/{BOT_USERNAME}?start=91`\n\n• *Har safar yangi kanal kerakmi?*\n  – Yo‘q, bitta server kanal yetarli\n\n• *Kodni tahrirlash/o‘chirish mumkinmi?*\n  – Ha, admin menyuda ✏️ / ❌ tugmalari bor")
+    "add": ("📥 *Anime qo‘shish*\n\n`KOD @kanal REKLAMA_ID POST_SONI ANIME_NOMI`\n\nMisol: `91 @MyKino 4 12 Naruto`\n\n• *Kod* – foydalanuvchi yozadigan raqam\n• *@kanal* – server kanal username\n• *REKLAMA_ID* – post ID raqami (raqam)\n• *POST_SONI* – nechta qism borligi\n• *ANIME_NOMI* – ko‘rsatiladigan sarlavha\n\n📩 Endi formatda xabar yuboring:"),
+    "channel": ("📡 *Kanal yaratish*\n\n1. 2 ta kanal yarating:\n   • *Server kanal* – post saqlanadi\n   • *Reklama kanal* – bot ulashadi\n\n2. Har ikkasiga botni admin qiling\n\n3. Kanalni public (@username) qiling"),
+    "id": ("🆔 *Reklama ID olish*\n\n1. Server kanalga post joylang\n\n2. Post ustiga bosing → *Share* → *Copy link*\n\n3. Link oxiridagi sonni oling\n\nMisol: `t.me/MyKino/4` → ID = `4`"),
+    "code": ("🔁 *Kod ishlashi*\n\n1. Foydalanuvchi kod yozadi (masalan: `91`)\n\n2. Obuna tekshiriladi → reklama post yuboriladi\n\n3. Tugmalar orqali qismlarni ochadi"),
+    "faq": ("❓ *Tez-tez so‘raladigan savollar*\n\n• *Kodni qanday ulashaman?*\n  `https://t.me/{BOT_USERNAME}?start=91`\n\n• *Har safar yangi kanal kerakmi?*\n  – Yo‘q, bitta server kanal yetarli\n\n• *Kodni tahrirlash/o‘chirish mumkinmi?*\n  – Ha, admin menyuda ✏️ / ❌ tugmalari bor")
 }
 
-@dp.callback_query_handler(lambda c: c.data.startswith("help_"))
-async def show_help_page(callback: types.CallbackQuery):
-    key = callback.data
+@router.callback("help", "h", str, legacy={f"help_{key}": (key,) for key in HELP_TEXTS})
+async def show_help_page(callback: types.CallbackQuery, key):
     text = HELP_TEXTS.get(key, "❌ Ma'lumot topilmadi.")
-    kb = InlineKeyboardMarkup().add(InlineKeyboardButton("⬅️ Ortga", callback_data="back_help"))
+    kb = InlineKeyboardMarkup().add(InlineKeyboardButton("⬅️ Ortga", callback_data=router.pack("back_help")))
     try:
         await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=kb)
     except:
@@ -716,16 +751,9 @@ async def show_help_page(callback: types.CallbackQuery):
     finally:
         await callback.answer()
 
-@dp.callback_query_handler(lambda c: c.data == "back_help")
+@router.callback("back_help", "b")
 async def back_to_qollanma(callback: types.CallbackQuery):
-    kb = InlineKeyboardMarkup(row_width=1)
-    kb.add(
-        InlineKeyboardButton("📥 1. Anime qo‘shish", callback_data="help_add"),
-        InlineKeyboardButton("📡 2. Kanal yaratish", callback_data="help_channel"),
-        InlineKeyboardButton("🆔 3. Reklama ID olish", callback_data="help_id"),
-        InlineKeyboardButton("🔁 4. Kod ishlashi", callback_data="help_code"),
-        InlineKeyboardButton("❓ 5. Savol-javob", callback_data="help_faq")
-    )
+    kb = help_keyboard()
     try:
         await callback.message.edit_text("📘 Qanday yordam kerak?", reply_markup=kb)
     except:
@@ -736,7 +764,7 @@ async def back_to_qollanma(callback: types.CallbackQuery):
 
 
 # === Habar yuborish ===
-@dp.message_handler(lambda m: m.text == "📢 Habar yuborish", user_id=ADMINS)
+@router.text("📢 Habar yuborish", admin_only=True)
 async def ask_broadcast_info(message: types.Message):
     await AdminStates.waiting_for_broadcast_data.set()
     await message.answer("📨 Habar yuborish uchun format:\n`@kanal xabar_id`", parse_mode="Markdown", reply_markup=control_keyboard())
@@ -758,30 +786,25 @@ async def send_forward_only(message: types.Message, state: FSMContext):
         await message.answer("❗ Xabar ID raqam bo‘lishi kerak.", reply_markup=control_keyboard())
         return
     msg_id = int(msg_id)
-    users = await get_all_user_ids()
-    success = 0
-    fail = 0
-    for user_id in users:
-        try:
-            await bot.forward_message(user_id, channel_username, msg_id)
-            success += 1
-        except Exception as e:
-            print(f"Xatolik {user_id} uchun: {e}")
-            fail += 1
-    await message.answer(f"✅ Yuborildi: {success} ta\n❌ Xatolik: {fail} ta", reply_markup=admin_keyboard())
+    job = await start_broadcast(bot, message.chat.id, channel_username, msg_id)
+    await message.answer(f"🚀 Habar yuborish #{job['id']} boshlandi. Holat yuqoridagi xabarda yangilanadi.", reply_markup=admin_keyboard())
 
 
 # === Kodni qidirish (raqam) ===
 @dp.message_handler(lambda message: message.text.isdigit())
 async def handle_code_message(message: types.Message):
-    code = message.text
-    if not await is_user_subscribed(message.from_user.id):
-        markup = await make_unsubscribed_markup(message.from_user.id, code)
-        await message.answer("❗ Anime olishdan oldin quyidagi kanal(lar)ga obuna bo‘ling:", reply_markup=markup)
+    await deliver_code(message.from_user.id, message.text)
+
+async def deliver_code(user_id, code):
+    """Kod (raqam yoki qidiruv natijasi) bo‘yicha obunani tekshirib postni yuboradi."""
+    unsubscribed = await get_unsubscribed_channels(user_id)
+    if unsubscribed:
+        markup = await make_unsubscribed_markup(user_id, code, unsubscribed)
+        await bot.send_message(user_id, "❗ Anime olishdan oldin quyidagi kanal(lar)ga obuna bo‘ling:", reply_markup=markup)
     else:
         await increment_stat(code, "init")
         await increment_stat(code, "searched")
-        await send_reklama_post(message.from_user.id, code)
+        await send_reklama_post(user_id, code)
         await increment_stat(code, "viewed")
 
 
@@ -792,8 +815,7 @@ async def send_reklama_post(user_id, code):
         await bot.send_message(user_id, "❌ Kod topilmadi.")
         return
     channel, reklama_id, post_count = data["channel"], data["message_id"], data["post_count"]
-    buttons = [InlineKeyboardButton(str(i), callback_data=f"kino:{code}:{i}") for i in range(1, post_count + 1)]
-    keyboard = InlineKeyboardMarkup(row_width=5).add(*buttons)
+    keyboard = episodes.episode_keyboard(code, post_count)
     try:
         await bot.copy_message(user_id, channel, reklama_id - 1, reply_markup=keyboard)
     except:
@@ -801,10 +823,8 @@ async def send_reklama_post(user_id, code):
 
 
 # === Kino tugmasi ===
-@dp.callback_query_handler(lambda c: c.data.startswith("kino:"))
-async def kino_button(callback: types.CallbackQuery):
-    _, code, number = callback.data.split(":")
-    number = int(number)
+@router.callback("kino", "k", str, int)
+async def kino_button(callback: types.CallbackQuery, code, number):
     result = await get_kino_by_code(code)
     if not result:
         await callback.message.answer("❌ Kod topilmadi.")
@@ -816,10 +836,73 @@ async def kino_button(callback: types.CallbackQuery):
     await bot.copy_message(callback.from_user.id, channel, base_id + number - 1)
     await callback.answer()
 
+
+# === Qismlar klaviaturasi sahifalari ===
+@router.callback("kinopage", "p", str, int)
+async def kino_page_button(callback: types.CallbackQuery, code, page):
+    result = await get_kino_by_code(code)
+    if not result:
+        await callback.answer("❌ Kod topilmadi.", show_alert=True)
+        return
+    markup = episodes.episode_keyboard(code, result["post_count"], page)
+    try:
+        await callback.message.edit_reply_markup(markup)
+    except MessageNotModified:
+        pass
+    await callback.answer()
+
+# === Qismlarni to‘plab yuborish (hammasi / oraliq) ===
+@router.callback("kinorange", "r", str, int, int)
+async def kino_range_button(callback: types.CallbackQuery, code, start, end):
+    result = await get_kino_by_code(code)
+    if not result:
+        await callback.answer("❌ Kod topilmadi.", show_alert=True)
+        return
+    if not 1 <= start <= end <= result["post_count"]:
+        await callback.answer("❌ Bunday post yo‘q!", show_alert=True)
+        return
+    if not episodes.start_sending(bot, callback.from_user.id, result, start, end):
+        await callback.answer("⏳ Oldingi qismlar hali yuborilmoqda.", show_alert=True)
+        return
+    await callback.answer(f"📥 {start}–{end} qismlar yuborilmoqda...")
+
 # === START ===
 async def on_startup(dp):
     await init_db()
     print("✅ PostgreSQL bazaga ulandi!")
+    print(f"✅ Adminlar yuklandi: {len(await admins.reload())} ta")
+    asyncio.create_task(listen_loop())
+    await channels.reload()
+    asyncio.create_task(channels.refresh_loop())
+    await konkurs.load_participants()
+    count = await load_kino_cache()
+    asyncio.create_task(kino_cache_refresh_loop())
+    print(f"✅ Kodlar keshi yuklandi: {count} ta")
+    await search.load_search_index()
+    asyncio.create_task(search.popularity_refresh_loop())
+    await load_inline_cache()
+    asyncio.create_task(inline_cache.refresh_loop())
+    asyncio.create_task(stats_flush_loop())
+    asyncio.create_task(chat_info.refresh_loop(bot))
+    users = await load_known_users()
+    asyncio.create_task(users_flush_loop())
+    print(f"✅ Foydalanuvchilar yuklandi: {users} ta")
+    resumed = await resume_broadcasts(bot)
+    if resumed:
+        print(f"✅ Tugallanmagan habar yuborishlar davom ettirildi: {resumed} ta")
+    asyncio.create_task(broadcast_resume_loop(bot))
+    pipeline.start()
+
+async def on_shutdown(dp):
+    await pipeline.stop()
+    await flush_new_users()
+    await flush_stats()
+    print("✅ Statistika bazaga yozildi.")
 
 if __name__ == "__main__":
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    if BOT_MODE == "webhook":
+        from webhook import start_webhook
+        start_webhook(dp, on_startup, on_shutdown)
+    else:
+        keep_alive()
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,165 @@
+import time
+from aiogram import Bot
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+# === Prometheus formatidagi metrikalar ===
+# Yozish faqat dict yangilash; /metrics so'rovi keep_alive oqimidan o'qiydi.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket_counts, sum, count]
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, list(counts)):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', bound))} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Qiymati /metrics so'ralganda funksiyadan olinadi."""
+
+    def __init__(self, name, documentation, func, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.func()
+        except Exception:
+            return lines
+        if not self.labelnames:
+            value = {(): value}
+        for labels, v in value.items():
+            if v is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {v}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# === Umumiy metrikalar ===
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Handler bajarilish vaqti", ("event", "handler")
+)
+api_requests = Counter("bot_api_requests_total", "Bot API chaqiruvlari", ("method",))
+api_errors = Counter("bot_api_errors_total", "Bot API xatolari", ("method", "error"))
+api_seconds = Histogram("bot_api_request_seconds", "Bot API chaqiruv vaqti", ("method",))
+db_acquire_seconds = Histogram(
+    "db_pool_acquire_seconds", "Pooldan ulanish olishni kutish vaqti",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+cache_requests = Counter("cache_requests_total", "Kesh murojaatlari", ("cache", "result"))
+
+
+def cache_hit(cache):
+    cache_requests.inc(cache, "hit")
+
+
+def cache_miss(cache):
+    cache_requests.inc(cache, "miss")
+
+
+# === Handler vaqtini o'lchash ===
+class MetricsMiddleware(BaseMiddleware):
+    """process_* va post_process_* orasidagi vaqtni handler nomi bo'yicha yozadi."""
+
+    async def trigger(self, action, args):
+        if action.startswith("process_"):
+            data = args[-1]
+            # router.Router filtri haqiqiy handlerni data["route"] ga qo'yadi (aks holda hammasi "_dispatch")
+            route = data.get("route")
+            handler = route.handler if route is not None else current_handler.get(None)
+            data["_metrics_handler"] = getattr(handler, "__name__", "unknown")
+            data["_metrics_started"] = time.perf_counter()
+        elif action.startswith("post_process_"):
+            data = args[-1]
+            started = data.pop("_metrics_started", None)
+            if started is not None:
+                handler_seconds.observe(
+                    time.perf_counter() - started, action[len("post_process_"):], data.pop("_metrics_handler")
+                )
+
+
+# === Bot API chaqiruvlarini o'lchash ===
+class MetricsBot(Bot):
+    async def request(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception as e:
+            api_errors.inc(method, type(e).__name__)
+            raise
+        finally:
+            api_requests.inc(method)
+            api_seconds.observe(time.perf_counter() - started, method)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.webhook import SendMessage, AnswerCallbackQuery
+import metrics
+
+# === SOZLAMALAR ===
+# Update'larni qayta ishlovchi workerlar soni (bir foydalanuvchi doim bitta workerga tushadi)
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+# Har bir worker navbatining chegarasi; to'lsa yangi update rad etiladi
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "50"))
+# Bir chatga "band" javobi shuncha soniyada ko'pi bilan bir marta yuboriladi
+SHED_REPLY_INTERVAL = 10
+SHED_TEXT = "⏳ Bot hozir juda band. Iltimos, birozdan so‘ng qayta urinib ko‘ring."
+
+_USER_EVENTS = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+update_queue_wait = metrics.Histogram(
+    "update_queue_wait_seconds", "Update navbatda kutgan vaqt",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+updates_shed = metrics.Counter("updates_shed_total", "Navbat to'lgani uchun rad etilgan update'lar", ("kind",))
+
+
+def update_key(update):
+    """Tartib kaliti: foydalanuvchi (bo'lmasa chat) ID si."""
+    for name in _USER_EVENTS:
+        event = getattr(update, name)
+        if event is not None:
+            user = getattr(event, "from_user", None)
+            if user is not None:
+                return user.id
+            chat = getattr(event, "chat", None)
+            if chat is not None:
+                return chat.id
+    if update.poll_answer is not None:
+        return update.poll_answer.user.id
+    post = update.channel_post or update.edited_channel_post
+    if post is not None:
+        return post.chat.id
+    return update.update_id
+
+
+class UpdatePipeline:
+    """dp.updates_handler.notify o'rnini egallaydi: polling ham, webhook ham shu yerdan o'tadi.
+
+    Update foydalanuvchi ID si bo'yicha workerga taqsimlanadi - bir foydalanuvchining
+    update'lari kelgan tartibda, bittadan bajariladi. Navbat to'lsa update bajarilmaydi,
+    foydalanuvchiga tayyor "qayta urinib ko'ring" javobi qaytariladi.
+    """
+
+    def __init__(self, dispatcher, workers=UPDATE_WORKERS, queue_size=UPDATE_QUEUE_SIZE, webhook=False):
+        self.dispatcher = dispatcher
+        self.webhook = webhook  # webhook rejimida javob HTTP javobining o'zida qaytadi
+        self._workers = workers
+        self._queue_size = queue_size
+        self._queues = []
+        self._tasks = []
+        self._shed_replied = {}  # chat_id -> oxirgi "band" javobi vaqti
+        self._notify = dispatcher.updates_handler.notify
+        dispatcher.updates_handler.notify = self.submit
+        metrics.Gauge("update_queue_depth", "Navbatdagi update'lar", lambda: sum(q.qsize() for q in self._queues))
+        metrics.Gauge("update_queue_limit", "Navbatlar umumiy sig'imi", lambda: self._workers * self._queue_size)
+
+    def start(self):
+        self._queues = [asyncio.Queue(self._queue_size) for _ in range(self._workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Navbatda qolgan update'larni kutayotgan submit() lar osilib qolmasin
+        for queue in self._queues:
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
+
+    async def submit(self, update):
+        if not self._tasks:
+            return await self._notify(update)
+        queue = self._queues[update_key(update) % self._workers]
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait((update, future, time.monotonic()))
+        except asyncio.QueueFull:
+            return self._shed(update)
+        return await future
+
+    async def _worker(self, queue):
+        Dispatcher.set_current(self.dispatcher)
+        Bot.set_current(self.dispatcher.bot)
+        while True:
+            update, future, queued_at = await queue.get()
+            update_queue_wait.observe(time.monotonic() - queued_at)
+            try:
+                # Har update alohida task (kontekst nusxasi)da: aiogram StateFilter holatni
+                # ContextVar'da keshlaydi, umumiy kontekstda u keyingi foydalanuvchiga o'tib ketadi
+                result = await asyncio.create_task(self._notify(update))
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
+
+    # === Yuklamani tashlash ===
+    def _shed_response(self, update):
+        if update.callback_query is not None:
+            return AnswerCallbackQuery(update.callback_query.id, SHED_TEXT)
+        message = update.message
+        if message is None or message.chat.type != "private":
+            return None
+        now = time.monotonic()
+        if now - self._shed_replied.get(message.chat.id, 0) < SHED_REPLY_INTERVAL:
+            return None
+        if len(self._shed_replied) > 10000:
+            self._shed_replied.clear()
+        self._shed_replied[message.chat.id] = now
+        return SendMessage(message.chat.id, SHED_TEXT)
+
+    def _shed(self, update):
+        response = self._shed_response(update)
+        updates_shed.inc("replied" if response is not None else "dropped")
+        if response is None:
+            return []
+        if self.webhook:
+            return [[response]]  # WebhookRequestHandler.get_response shu ro'yxatdan oladi
+        task = asyncio.create_task(response.execute_response(self.dispatcher.bot))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return []
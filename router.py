@@ -0,0 +1,141 @@
+import inspect
+import metrics
+
+# === CALLBACK_DATA FORMATI ===
+# v1: versiya + qisqa nom + argumentlar: "1k:91:3" (eski ko'rinishi "kino:91:3").
+# Eski klaviaturalar chatlarda qoladi, shuning uchun eski formatlar ham qabul qilinadi.
+CALLBACK_VERSION = "1"
+CALLBACK_SEP = ":"
+CALLBACK_MAX_BYTES = 64  # Telegram cheklovi
+
+invalid_callbacks = metrics.Counter(
+    "callback_data_invalid_total", "Tanilmagan yoki buzilgan callback_data", ("reason",)
+)
+
+
+class Route:
+    __slots__ = ("name", "short", "handler", "types", "admin_only", "wants_state")
+
+    def __init__(self, name, short, handler, types, admin_only):
+        self.name = name
+        self.short = short
+        self.handler = handler
+        self.types = types
+        self.admin_only = admin_only
+        self.wants_state = "state" in inspect.signature(handler).parameters
+
+    def convert(self, values):
+        """Argumentlar soni va turlarini tekshiradi; mos kelmasa None."""
+        if len(values) != len(self.types):
+            return None
+        try:
+            return tuple(kind(value) for kind, value in zip(self.types, values))
+        except ValueError:
+            return None
+
+    async def call(self, event, args, state):
+        if self.wants_state:
+            return await self.handler(event, *args, state=state)
+        return await self.handler(event, *args)
+
+
+class Router:
+    """Callback va reply-tugma matnlari uchun jadvalli dispatch.
+
+    Dispatcherda bittadan handler turadi: callback_data prefiksi yoki xabar matni
+    dict orqali topiladi, lambda filtrlar zanjiri bo'ylab yurilmaydi. Handlerlar
+    aiogramdagidek standart holat (state=None) uchun ishlaydi.
+    """
+
+    def __init__(self):
+        self._callbacks = {}  # qisqa nom -> Route
+        self._legacy = {}  # eski prefiks -> (Route, oldindan qo'shiladigan argumentlar)
+        self._by_name = {}
+        self._texts = {}  # tugma matni -> Route
+        self._is_admin = None
+
+    # === Ro'yxatdan o'tkazish ===
+    def callback(self, name, short, *types, admin_only=False, legacy=None):
+        """handler(callback, *args[, state]) ni ro'yxatga oladi.
+
+        legacy: {eski_prefiks: (qo'shimcha argumentlar)}; berilmasa eski prefiks = name.
+        """
+        def decorator(handler):
+            if short in self._callbacks or name in self._by_name:
+                raise ValueError(f"Callback yo'nalishi takrorlandi: {name}")
+            route = Route(name, short, handler, types, admin_only)
+            self._callbacks[short] = route
+            self._by_name[name] = route
+            for prefix, fixed in (legacy or {name: ()}).items():
+                self._legacy[prefix] = (route, tuple(fixed))
+            return handler
+        return decorator
+
+    def text(self, text, admin_only=False):
+        def decorator(handler):
+            if text in self._texts:
+                raise ValueError(f"Tugma matni takrorlandi: {text}")
+            self._texts[text] = Route(text, None, handler, (), admin_only)
+            return handler
+        return decorator
+
+    def register(self, dp, is_admin):
+        """Dispatcherga ikkita umumiy handler qo'shadi (raqamli kod handleridan oldin)."""
+        self._is_admin = is_admin
+        dp.register_callback_query_handler(self._dispatch, self._match_callback)
+        dp.register_message_handler(self._dispatch, self._match_text)
+
+    # === Kodlash ===
+    def pack(self, name, *values):
+        route = self._by_name[name]
+        values = [str(value) for value in values]
+        if len(values) != len(route.types) or any(CALLBACK_SEP in v for v in values[:-1]):
+            raise ValueError(f"{name} uchun noto'g'ri argumentlar: {values}")
+        data = CALLBACK_SEP.join([CALLBACK_VERSION + route.short, *values])
+        if len(data.encode()) > CALLBACK_MAX_BYTES:
+            raise ValueError(f"callback_data {CALLBACK_MAX_BYTES} baytdan uzun: {data}")
+        return data
+
+    def parse(self, data):
+        """(Route, argumentlar) yoki None. Tekshiruv faqat shu yerda, bir marta."""
+        if not data:
+            return None
+        head, _, rest = data.partition(CALLBACK_SEP)
+        if head[:1] == CALLBACK_VERSION:
+            route, fixed = self._callbacks.get(head[1:]), ()
+        elif head[:1].isdigit():
+            invalid_callbacks.inc("version")
+            return None
+        else:
+            route, fixed = self._legacy.get(head, (None, ()))
+        if route is None:
+            invalid_callbacks.inc("unknown")
+            return None
+        count = len(route.types) - len(fixed)
+        values = fixed + (tuple(rest.split(CALLBACK_SEP, count - 1)) if count > 0 else ())
+        args = route.convert(values)
+        if args is None:
+            invalid_callbacks.inc("args")
+        return None if args is None else (route, args)
+
+    # === Filtrlar va dispatch ===
+    def _allowed(self, route, user):
+        return not route.admin_only or self._is_admin(user.id)
+
+    def _match_callback(self, callback):
+        parsed = self.parse(callback.data)
+        if parsed is None or not self._allowed(parsed[0], callback.from_user):
+            return False
+        return {"route": parsed[0], "route_args": parsed[1]}
+
+    def _match_text(self, message):
+        route = self._texts.get(message.text)
+        if route is None or not self._allowed(route, message.from_user):
+            return False
+        return {"route": route, "route_args": ()}
+
+    async def _dispatch(self, event, route, route_args, state):
+        return await route.call(event, route_args, state)
+
+
+router = Router()
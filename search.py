@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import os
+import re
+import unicodedata
+import database
+
+# === SOZLAMALAR ===
+SEARCH_LIMIT = 10
+POPULARITY_REFRESH_INTERVAL = int(os.getenv("POPULARITY_REFRESH_INTERVAL", "300"))
+
+_APOSTROPHES = str.maketrans("", "", "'‘’ʻʼ`")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_APOSTROPHES)
+    return _NON_WORD.sub(" ", text).split()
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_typos(token):
+    return 1 if len(token) <= 5 else 2
+
+
+def _edit_distance(a, b, limit):
+    """Damerau-Levenshtein (OSA) masofasi; limit dan oshsa limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        best = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, prev2[j - 2] + 1)
+            cur[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+# === INDEKS ===
+class SearchIndex:
+    """kino_codes.title bo'yicha xotiradagi indeks.
+
+    So'zlar: aniq moslik -> prefiks (saralangan ro'yxatda bisect) -> trigram
+    bo'yicha xato yozilgan so'z. Teng natijalar stats.searched bo'yicha saralanadi.
+    """
+
+    def __init__(self):
+        self._clear()
+        self.popularity = {}      # code -> searched; faqat set_popularity orqali o'zgaradi
+        self.popularity_version = 0  # tartib keshlari (inline) shu raqam bo'yicha eskiradi
+
+    def _clear(self):
+        self._titles = {}         # code -> title
+        self._doc_tokens = {}     # code -> tuple(token)
+        self._token_codes = {}    # token -> set(code)
+        self._sorted_tokens = []  # prefiks qidiruv uchun
+        self._trigram_tokens = {}  # trigram -> set(token)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _add_token(self, token, code):
+        codes = self._token_codes.get(token)
+        if codes is None:
+            codes = self._token_codes[token] = set()
+            bisect.insort(self._sorted_tokens, token)
+            for gram in _trigrams(token):
+                self._trigram_tokens.setdefault(gram, set()).add(token)
+        codes.add(code)
+
+    def _remove_token(self, token, code):
+        codes = self._token_codes.get(token)
+        if codes is None:
+            return
+        codes.discard(code)
+        if codes:
+            return
+        del self._token_codes[token]
+        del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+        for gram in _trigrams(token):
+            tokens = self._trigram_tokens.get(gram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._trigram_tokens[gram]
+
+    def remove(self, code):
+        for token in self._doc_tokens.pop(code, ()):
+            self._remove_token(token, code)
+        self._titles.pop(code, None)
+
+    def upsert(self, code, title):
+        self.remove(code)
+        tokens = tuple(dict.fromkeys(normalize(title)))
+        self._titles[code] = title
+        self._doc_tokens[code] = tokens
+        for token in tokens:
+            self._add_token(token, code)
+
+    def set_popularity(self, counts):
+        self.popularity = counts
+        self.popularity_version += 1
+
+    def rebuild(self, records):
+        self._clear()
+        for record in records:
+            self.upsert(record.code, record.title or "")
+
+    def _prefix_tokens(self, prefix):
+        tokens = self._sorted_tokens
+        i = bisect.bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            yield tokens[i]
+            i += 1
+
+    def _fuzzy_tokens(self, token):
+        """Trigramlar nomzodlarni tanlaydi, OSA masofasi xatoni tasdiqlaydi."""
+        limit = _max_typos(token)
+        grams = _trigrams(token)
+        # q-gram lemmasi: k ta xato ko'pi bilan 3k ta trigramni buzadi; bitta
+        # umumiy trigram ("  n" kabi) minglab so'zga mos keladi, shuning uchun kamida 2 ta
+        required = max(2 if len(token) > 3 else 1, len(grams) - 3 * limit)
+        shared = {}
+        for gram in grams:
+            for candidate in self._trigram_tokens.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        for candidate, count in shared.items():
+            if count < required or abs(len(candidate) - len(token)) > limit:
+                continue
+            distance = _edit_distance(token, candidate, limit)
+            if distance <= limit:
+                yield candidate, 1 - distance / max(len(token), len(candidate))
+
+    def _match_token(self, query_token):
+        scores = {}
+        for code in self._token_codes.get(query_token, ()):
+            scores[code] = 1.0
+        for token in self._prefix_tokens(query_token):
+            for code in self._token_codes[token]:
+                if code not in scores:
+                    scores[code] = 0.8
+        if not scores:
+            for token, similarity in self._fuzzy_tokens(query_token):
+                for code in self._token_codes[token]:
+                    scores[code] = max(scores.get(code, 0), 0.6 * similarity)
+        return scores
+
+    def tokens(self):
+        return list(self._token_codes)
+
+    def popular(self, limit=SEARCH_LIMIT):
+        """Bo'sh so'rov uchun: eng ko'p qidirilgan kodlar."""
+        ranked = sorted(self._titles, key=lambda code: (-self.popularity.get(code, 0), code))
+        return [(code, self._titles[code]) for code in ranked[:limit]]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """[(code, title)] - har bir so'rov so'zi nomda bo'lishi kerak."""
+        scores = None
+        for query_token in normalize(query):
+            matched = self._match_token(query_token)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {code: scores[code] + score for code, score in matched.items() if code in scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        ranked = sorted(
+            scores.items(), key=lambda item: (-item[1], -self.popularity.get(item[0], 0), item[0])
+        )
+        return [(code, self._titles[code]) for code, _ in ranked[:limit]]
+
+
+index = SearchIndex()
+
+
+def _on_kino_change(code, record):
+    if record is None:
+        index.remove(code)
+    else:
+        index.upsert(code, record.title or "")
+
+
+async def load_search_index():
+    """Kodlar keshi yuklangandan keyin chaqiriladi (on_startup)."""
+    index.rebuild(database.kino_records())
+    database.on_kino_change(_on_kino_change)
+    index.set_popularity(await database.get_searched_counts())
+    return len(index)
+
+
+async def popularity_refresh_loop():
+    while True:
+        await asyncio.sleep(POPULARITY_REFRESH_INTERVAL)
+        try:
+            index.set_popularity(await database.get_searched_counts())
+        except Exception as e:
+            print(f"❗ Mashhurlik ma'lumotini yangilashda xatolik: {e}")
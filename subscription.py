@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+import metrics
+
+# === SOZLAMALAR ===
+SUBSCRIBED_STATUSES = ("member", "administrator", "creator")
+# Ijobiy natija (obuna bo'lgan) shuncha soniya keshda turadi
+SUB_CACHE_TTL = int(os.getenv("SUB_CACHE_TTL", "300"))
+SUB_CACHE_MAX_SIZE = int(os.getenv("SUB_CACHE_MAX_SIZE", "200000"))
+
+
+# === OBUNA XIZMATI ===
+class SubscriptionChecker:
+    """Kanallarni parallel tekshiradi va (user, kanal) bo'yicha ijobiy natijalarni keshlaydi.
+
+    Salbiy natija keshlanmaydi: foydalanuvchi obuna bo'lib "Tekshirish"ni
+    bosganda faqat hali tasdiqlanmagan kanallar qayta so'raladi. Olib tashlangan
+    kanal yozuvlarini channels.reload() o'chiradi; foydalanuvchi kanaldan chiqsa
+    (bot bu haqda xabar olmaydi) yozuv SUB_CACHE_TTL tugaguncha qoladi.
+    """
+
+    def __init__(self, ttl=SUB_CACHE_TTL, max_size=SUB_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._subscribed = {}  # (user_id, channel_id) -> tugash vaqti
+
+    def _remember(self, user_id, channel_id):
+        if len(self._subscribed) >= self.max_size:
+            self._prune()
+        self._subscribed[(user_id, channel_id)] = time.monotonic() + self.ttl
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [key for key, expires_at in self._subscribed.items() if expires_at <= now]
+        for key in expired:
+            del self._subscribed[key]
+        if len(self._subscribed) >= self.max_size:
+            self._subscribed.clear()
+
+    def forget(self, user_id=None, channel_id=None):
+        """Kesh yozuvlarini o'chiradi (channels.reload kanal olib tashlanganda chaqiradi)."""
+        if user_id is None and channel_id is None:
+            self._subscribed.clear()
+            return
+        for key in list(self._subscribed):
+            if (user_id is None or key[0] == user_id) and (channel_id is None or key[1] == channel_id):
+                del self._subscribed[key]
+
+    async def _check_channel(self, bot, channel_id, user_id):
+        try:
+            member = await bot.get_chat_member(channel_id, user_id)
+        except Exception as e:
+            print(f"❗ Obuna tekshirishda xatolik: {channel_id} -> {e}")
+            return False
+        if getattr(member, "status", None) in SUBSCRIBED_STATUSES:
+            self._remember(user_id, channel_id)
+            return True
+        return False
+
+    async def get_unsubscribed(self, bot, user_id, channels, use_cache=True):
+        """Obuna bo'linmagan kanallar ro'yxati (channels tartibida).
+
+        use_cache=False - keshga qaramasdan hamma kanal qayta tekshiriladi.
+        """
+        now = time.monotonic()
+        pending = [
+            channel_id for channel_id in channels
+            if not use_cache or self._subscribed.get((user_id, channel_id), 0) <= now
+        ]
+        hits = len(channels) - len(pending)
+        if hits:
+            metrics.cache_requests.inc("subscription", "hit", amount=hits)
+        if not pending:
+            return []
+        metrics.cache_requests.inc("subscription", "miss", amount=len(pending))
+        results = await asyncio.gather(
+            *(self._check_channel(bot, channel_id, user_id) for channel_id in pending)
+        )
+        return [channel_id for channel_id, ok in zip(pending, results) if not ok]
+
+    async def is_subscribed(self, bot, user_id, channels, use_cache=True):
+        return not await self.get_unsubscribed(bot, user_id, channels, use_cache)
+
+
+subscriptions = SubscriptionChecker()
+metrics.Gauge("subscription_cache_size", "Keshlangan obuna natijalari", lambda: len(subscriptions._subscribed))
@@ -0,0 +1,124 @@
+"""PostgresStorage: haqiqiy Postgres bilan sinov (TEST_DATABASE_URL berilmasa o'tkazib yuboriladi).
+
+    TEST_DATABASE_URL=postgresql://postgres@127.0.0.1:5432/postgres python -m unittest discover -s tests
+
+Faqat sinov bazasida ishga tushiring: fsm_states jadvaliga manfiy chat/user ID li
+yozuvlar qo'shiladi va har bir testdan keyin o'chiriladi.
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = os.getenv("TEST_DATABASE_URL")
+if DSN:
+    os.environ["DATABASE_URL"] = DSN
+    os.environ.setdefault("DB_SSL", "disable")
+
+from aiogram.dispatcher.storage import FSMContext  # noqa: E402
+import database  # noqa: E402
+from fsm_storage import PostgresStorage  # noqa: E402
+
+CHAT = USER = -424242
+NOTIFY_TIMEOUT = 5
+
+
+@unittest.skipUnless(DSN, "TEST_DATABASE_URL berilmagan")
+class PostgresStorageTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await database.init_db()
+        await self._cleanup()
+        self.storage = PostgresStorage()
+        self.context = FSMContext(self.storage, CHAT, USER)
+
+    async def asyncTearDown(self):
+        await self._cleanup()
+        await database.db_pool.close()
+
+    async def _cleanup(self):
+        async with database.acquire() as conn:
+            await conn.execute("DELETE FROM fsm_states WHERE chat_id = $1", CHAT)
+
+    async def _row(self):
+        async with database.acquire() as conn:
+            return await conn.fetchrow(
+                "SELECT state, data::text FROM fsm_states WHERE chat_id = $1 AND user_id = $2", CHAT, USER
+            )
+
+    async def test_empty_state(self):
+        self.assertIsNone(await self.context.get_state())
+        self.assertEqual(await self.context.get_data(), {})
+
+    async def test_set_state_and_update_data_merge(self):
+        await self.context.set_state("AdminStates:waiting")
+        await self.context.update_data(code="91", parts=3)
+        await self.context.update_data({"parts": 4}, title="Naruto")
+        self.assertEqual(await self.context.get_state(), "AdminStates:waiting")
+        self.assertEqual(await self.context.get_data(), {"code": "91", "parts": 4, "title": "Naruto"})
+
+        # set_data merge qilmaydi, butunlay almashtiradi; holat o'zgarmaydi
+        await self.context.set_data({"only": True})
+        self.assertEqual(await self.context.get_data(), {"only": True})
+        self.assertEqual(await self.context.get_state(), "AdminStates:waiting")
+
+    async def test_finish_clears_state_and_data(self):
+        await self.context.set_state("AdminStates:waiting")
+        await self.context.update_data(code="91")
+        await self.context.finish()
+        self.assertIsNone(await self.context.get_state())
+        self.assertEqual(await self.context.get_data(), {})
+        self.assertIsNone(await self._row())  # bo'sh qator bazada qolmaydi
+
+    async def test_reset_state_without_data_keeps_data(self):
+        await self.context.set_state("AdminStates:waiting")
+        await self.context.update_data(code="91")
+        await self.context.reset_state(with_data=False)
+        self.assertIsNone(await self.context.get_state())
+        self.assertEqual(await self.context.get_data(), {"code": "91"})
+
+    async def test_fresh_instance_reads_from_database(self):
+        await self.context.set_state("AdminStates:waiting")
+        await self.context.update_data(code="91")
+        fresh = FSMContext(PostgresStorage(), CHAT, USER)
+        self.assertEqual(await fresh.get_state(), "AdminStates:waiting")
+        self.assertEqual(await fresh.get_data(), {"code": "91"})
+
+    async def test_notify_evicts_other_instance_cache(self):
+        ready = asyncio.Event()
+        database.listen("fsm_states", lambda payload: None, on_reset=ready.set)
+        other = PostgresStorage()
+        other_context = FSMContext(other, CHAT, USER)
+        listener = asyncio.create_task(database.listen_loop())
+        try:
+            await asyncio.wait_for(ready.wait(), NOTIFY_TIMEOUT)
+            # Ikkinchi "jarayon" bo'sh holatni keshlaydi
+            self.assertIsNone(await other_context.get_state())
+            self.assertIn((CHAT, USER), other._cache)
+
+            await self.context.set_state("AdminStates:waiting")
+            await self.context.update_data(code="91")
+            await self._wait_evicted(other)
+            self.assertEqual(await other_context.get_state(), "AdminStates:waiting")
+            self.assertEqual(await other_context.get_data(), {"code": "91"})
+
+            # O'zimizning NOTIFY keshimizni o'chirmaydi
+            self.assertIn((CHAT, USER), self.storage._cache)
+
+            await self.context.finish()
+            await self._wait_evicted(other)
+            self.assertIsNone(await other_context.get_state())
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    async def _wait_evicted(self, storage):
+        async def evicted():
+            while (CHAT, USER) in storage._cache:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(evicted(), NOTIFY_TIMEOUT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import hmac
+import os
+from aiohttp import web
+from aiogram.utils import executor
+import metrics
+
+# === SOZLAMALAR ===
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")  # masalan: https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = WEBHOOK_HOST.rstrip("/") + WEBHOOK_PATH
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Telegram bir vaqtda ochadigan ulanishlar soni (qayta ishlash chegarasi - pipeline.py)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", os.getenv("WEBHOOK_WORKERS", "40")))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", os.getenv("PORT", "8080")))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# === HTTP YO'LLARI ===
+async def health(request):
+    return web.Response(text="Bot tirik!")
+
+
+async def metrics_page(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+def build_app():
+    @web.middleware
+    async def webhook_guard(request, handler):
+        if request.path != WEBHOOK_PATH:
+            return await handler(request)
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET
+        ):
+            return web.Response(status=401)
+        return await handler(request)
+
+    app = web.Application(middlewares=[webhook_guard])
+    app.router.add_get("/", health)
+    app.router.add_get("/metrics", metrics_page)
+    return app
+
+
+async def _set_webhook(dp):
+    await dp.bot.set_webhook(
+        WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=min(WEBHOOK_MAX_CONNECTIONS, 100),
+        drop_pending_updates=True,
+    )
+    print(f"✅ Webhook o‘rnatildi: {WEBHOOK_URL}")
+
+
+def start_webhook(dp, on_startup, on_shutdown):
+    """Polling bilan bir xil on_startup/on_shutdown, bitta event loop va bitta aiohttp server."""
+    if not WEBHOOK_HOST:
+        raise RuntimeError("WEBHOOK_HOST ko‘rsatilmagan")
+    loop = asyncio.get_event_loop()
+    webhook_executor = executor.set_webhook(
+        dispatcher=dp,
+        webhook_path=WEBHOOK_PATH,
+        loop=loop,
+        on_startup=[on_startup, _set_webhook],
+        on_shutdown=on_shutdown,
+        web_app=build_app(),
+    )
+    webhook_executor.run_app(host=WEBAPP_HOST, port=WEBAPP_PORT, loop=loop)